@@ -1,27 +1,128 @@
-from langchain_openai import OpenAIEmbeddings
-from pymongo import MongoClient
+import argparse
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from pymongo.collection import Collection
+from llm import STORY_EMBEDDING_MODEL, STORY_EMBEDDING_DIMENSIONS, embedding_model_id, get_text_embeddings_batch
+
+# Only what the embedding text needs
+EMBED_PROJECTION = {'headline': 1, 'summary.summary': 1}
+
+def story_embed_text(story: dict) -> str:
+    # Must match what the ingest embeds (main.py)
+    return story['headline'] + "\n\n" + story['summary']['summary']
+
+def stale_query(field: str, model_id: str) -> dict:
+    """
+    Stories whose `field` is missing or was made by another model. Stories
+    embedded before the model was recorded count as the ingest's model.
+    """
+    model_field = field + '_model'
+    current = [model_id]
+    if model_id == embedding_model_id(STORY_EMBEDDING_MODEL, STORY_EMBEDDING_DIMENSIONS):
+        current.append(None)
+    return {'$or': [
+        {field: {'$exists': False}},
+        {model_field: {'$nin': current}},
+    ]}
+
+def embed_batch(stories: list[dict], field: str, model: str, dimensions: int) -> list[UpdateOne]:
+    stories = [s for s in stories if s.get('headline') and (s.get('summary') or {}).get('summary')]
+    if not stories:
+        return []
+    vectors = get_text_embeddings_batch([story_embed_text(s) for s in stories], model=model, dimensions=dimensions)
+    model_id = embedding_model_id(model, dimensions)
+    return [
+        UpdateOne({'_id': s['_id']}, {'$set': {field: v, field + '_model': model_id}})
+        for s, v in zip(stories, vectors)
+    ]
+
+def backfill(stories_col: Collection, meta_col: Collection, field: str, model: str, dimensions: int,
+             batch_size: int, workers: int, limit: int = 0, dry_run: bool = False) -> int:
+    """
+    Embeds every stale story, in _id order. Each round reads `workers`
+    batches, embeds them concurrently, writes them with one bulk_write and
+    then saves the last _id in meta, so an interrupted run resumes there.
+    Stories updated by a round drop out of the stale query, so a rerun
+    without the checkpoint only costs the query.
+
+    Returns:
+        int: Number of stories embedded
+    """
+    model_id = embedding_model_id(model, dimensions)
+    checkpoint_id = f"embed_backfill:{field}:{model_id}"
+    checkpoint = meta_col.find_one({'_id': checkpoint_id}) or {}
+    query = stale_query(field, model_id)
+    print(f"Embedding {stories_col.count_documents(query)} stories into '{field}' with {model_id}")
+
+    last_id = checkpoint.get('last_id')
+    done = 0
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while not limit or done < limit:
+            round_query = dict(query, _id={'$gt': last_id}) if last_id else query
+            round_size = batch_size * workers
+            if limit:
+                round_size = min(round_size, limit - done)
+            stories = list(stories_col.find(round_query, EMBED_PROJECTION).sort('_id', 1).limit(round_size))
+            if not stories:
+                break
+            last_id = stories[-1]['_id']
+            if dry_run:
+                done += len(stories)
+                continue
+
+            batches = [stories[i:i + batch_size] for i in range(0, len(stories), batch_size)]
+            ops = [op for batch_ops in pool.map(lambda b: embed_batch(b, field, model, dimensions), batches)
+                   for op in batch_ops]
+            if ops:
+                stories_col.bulk_write(ops, ordered=False)
+            meta_col.update_one({'_id': checkpoint_id}, {'$set': {'last_id': last_id}}, upsert=True)
+            done += len(ops)
+            rate = done / max(time.time() - started, 1e-6)
+            print(f"Embedded {done} stories ({rate:.0f}/s), up to {last_id}")
+
+    if not dry_run and not limit:
+        # Finished: a later run starts from the beginning, picking up
+        # stories that were skipped or ingested meanwhile
+        meta_col.delete_one({'_id': checkpoint_id})
+    return done
 
 def main():
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-small", 
-        dimensions=512
-    )
+    """
+    Backfill story embeddings.
+
+    To move to a new model or dimension without downtime, embed into a new
+    field (e.g. --field embedding_v2 --dimensions 1024), build an Atlas vector
+    index on it, switch the ingest and the index name over, then run the
+    backfill again to catch stories ingested in the meantime.
+    """
+    parser = argparse.ArgumentParser(description="Embed stories that are missing or have outdated embeddings.")
+    parser.add_argument('--field', default='embedding', help="Field to write vectors to (default: embedding)")
+    parser.add_argument('--model', default=STORY_EMBEDDING_MODEL)
+    parser.add_argument('--dimensions', type=int, default=STORY_EMBEDDING_DIMENSIONS)
+    parser.add_argument('--batch-size', type=int, default=256, help="Texts per embedding request")
+    parser.add_argument('--workers', type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument('--limit', type=int, default=0, help="Stop after this many stories")
+    parser.add_argument('--restart', action='store_true', help="Ignore the saved checkpoint")
+    parser.add_argument('--dry-run', action='store_true', help="Count stale stories without embedding them")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env_path = os.path.join(script_dir, '../.env')
+    print(f"Loading environment variables from {env_path}")
+    load_dotenv(env_path)
 
     client = MongoClient(os.getenv("MONGO_URI"))
     db = client.get_database('nb3000')
-    stories_col = db.get_collection('stories')
-
-    stories = stories_col.find({})
-    for story in stories:
-        if story.get('embedding'):
-            print(f"Skipping {story['headline']} because it already has an embedding")
-            continue
-        print(story['headline'])
-        text = story['headline'] + "\n\n" + story['summary']['summary']
-        embedding_vector = embeddings.embed_query(text)
-        story['embedding'] = embedding_vector
-        stories_col.update_one({'_id': story['_id']}, {'$set': {'embedding': embedding_vector}})
+    if args.restart:
+        db['meta'].delete_one({'_id': f"embed_backfill:{args.field}:{embedding_model_id(args.model, args.dimensions)}"})
+
+    count = backfill(db['stories'], db['meta'], args.field, args.model, args.dimensions,
+                     args.batch_size, args.workers, args.limit, args.dry_run)
+    print(f"{'Would embed' if args.dry_run else 'Embedded'} {count} stories")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,47 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from bson import ObjectId
+
+@dataclass
+class Changes:
+    """
+    What a run added or rewrote, collected as it goes and written to the
+    change log along with its data version. The web app's delta endpoint
+    (/api/v1/changes) serves these to polling clients.
+    """
+    stories: list[ObjectId] = field(default_factory=list)
+    topics: list[ObjectId] = field(default_factory=list)
+    # Topic id -> id of the topic it was merged into
+    removed_topics: dict[ObjectId, ObjectId] = field(default_factory=dict)
+    summary: bool = False
+
+    def add_story(self, story_id: ObjectId):
+        if story_id not in self.stories:
+            self.stories.append(story_id)
+
+    def add_topic(self, topic_id: ObjectId):
+        if topic_id not in self.topics:
+            self.topics.append(topic_id)
+
+    def remove_topic(self, topic_id: ObjectId, merged_into: ObjectId):
+        self.removed_topics[topic_id] = merged_into
+        if topic_id in self.topics:
+            self.topics.remove(topic_id)
+
+    def empty(self) -> bool:
+        return not (self.stories or self.topics or self.removed_topics or self.summary)
+
+def change_entry(changes: Changes) -> dict:
+    """
+    The change log document for a run's changes, stored under the data
+    version it produced (see data_version.bump_data_version). Entries expire
+    after a while (see web/schema.py), after which clients asking for older
+    changes are told to reload instead.
+    """
+    return {
+        "time": datetime.now(),
+        "stories": changes.stories,
+        "topics": changes.topics,
+        "removed_topics": [{ "_id": t, "merged_into": m } for t, m in changes.removed_topics.items()],
+        "summary": changes.summary
+    }
@@ -0,0 +1,209 @@
+import argparse
+from dotenv import load_dotenv
+import os
+from datetime import datetime
+from typing import Callable, Optional
+from pymongo import MongoClient, UpdateOne
+from pymongo.collection import Collection
+from llm import summarize_stories, TOPIC_SUMMARY_MAX_STORIES
+from data_version import bump_data_version
+from change_log import Changes
+from feeds import write_feed_snapshots
+from syndication import write_syndication_feeds
+from topic_lock import lock_owner, acquire_topic_lock, release_topic_lock
+from topics import ACTIVE_TOPIC_HORIZON, similarity_score, merge_centroids, compute_centroid
+
+# Two topics whose centroids score at least this high are the same event.
+MERGE_SCORE = 0.95
+# ... as are two topics sharing this fraction of the smaller topic's stories.
+MERGE_OVERLAP = 0.5
+# Members scoring below this against their topic's centroid are split out.
+SPLIT_SCORE = 0.85
+# Topics smaller than this are never split.
+SPLIT_MIN_MEMBERS = 3
+
+def find_merge_groups(topics: list[dict]) -> list[list[dict]]:
+    """
+    Groups near-duplicate topics by centroid similarity or member overlap.
+    Returns only groups with more than one topic.
+    """
+    parent = list(range(len(topics)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    members = [set(t.get('stories', [])) for t in topics]
+    for i in range(len(topics)):
+        for j in range(i + 1, len(topics)):
+            smaller = min(len(members[i]), len(members[j]))
+            overlap = len(members[i] & members[j]) / smaller if smaller else 0
+            if overlap >= MERGE_OVERLAP or similarity_score(topics[i]['centroid'], topics[j]['centroid']) >= MERGE_SCORE:
+                parent[find(i)] = find(j)
+
+    groups = {}
+    for i, t in enumerate(topics):
+        groups.setdefault(find(i), []).append(t)
+    return [g for g in groups.values() if len(g) > 1]
+
+def merge_topics(topics: list[dict], stories_col: Collection, topics_col: Collection, changes: Changes,
+                 dry_run: bool = False, renew_lock: Optional[Callable[[], bool]] = None) -> int:
+    """
+    Merges each group of near-duplicate topics into its largest member.
+    Each group is written as soon as its summary is ready, and only while
+    renew_lock (which renews the topic lock) reports the lock is still held;
+    summaries are slow enough that the lease could otherwise run out.
+
+    Returns:
+        int: Number of groups merged
+    """
+    groups = find_merge_groups(topics)
+    merged = 0
+    for group in groups:
+        # Keep the largest topic, so most existing /topic links stay canonical.
+        group.sort(key=lambda t: (-t.get('member_count', 1), t['_id']))
+        keeper, absorbed = group[0], group[1:]
+        story_ids = list(dict.fromkeys(s for t in group for s in t.get('stories', [])))
+        centroid, count = keeper['centroid'], keeper.get('member_count', 1)
+        for t in absorbed:
+            centroid = merge_centroids(centroid, count, t['centroid'], t.get('member_count', 1))
+            count += t.get('member_count', 1)
+        print(f"Merging {[t['_id'] for t in absorbed]} into {keeper['_id']} ({len(story_ids)} stories)")
+        if dry_run:
+            merged += 1
+            continue
+
+        members = list(stories_col.find({ "_id": { "$in": story_ids } }, { "headline": 1, "summary": 1, "updated": 1 })
+                       .sort('updated', -1).limit(TOPIC_SUMMARY_MAX_STORIES))
+        summary = summarize_stories(members)
+        if renew_lock is not None and not renew_lock():
+            print("Lost the topic lock, not merging the remaining groups")
+            break
+        stories_col.update_many({ "_id": { "$in": story_ids } }, { "$set": { "topic": keeper['_id'] } })
+        topic_ops = [UpdateOne({ "_id": keeper['_id'] }, { "$set": {
+            "updated": max(t['updated'] for t in group),
+            "source": "multiple",
+            "stories": story_ids,
+            "summary": summary,
+            "centroid": centroid,
+            "member_count": len(story_ids)
+        } })]
+        changes.add_topic(keeper['_id'])
+        for t in absorbed:
+            topic_ops.append(UpdateOne({ "_id": t['_id'] }, {
+                "$set": { "merged_into": keeper['_id'] },
+                "$unset": { "stories": "", "centroid": "", "member_count": "" }
+            }))
+            changes.remove_topic(t['_id'], keeper['_id'])
+        topics_col.bulk_write(topic_ops, ordered=False)
+        merged += 1
+    return merged
+
+def split_topics(topics: list[dict], stories_col: Collection, topics_col: Collection, changes: Changes,
+                 dry_run: bool = False, renew_lock: Optional[Callable[[], bool]] = None) -> int:
+    """
+    Splits the members that stray from their topic's centroid out into
+    topics of their own. Like merge_topics, each topic is written once its
+    summary is ready and only while renew_lock reports the lock is held.
+
+    Returns:
+        int: Number of topics split
+    """
+    split_count = 0
+    for topic in topics:
+        story_ids = topic.get('stories', [])
+        if len(story_ids) < SPLIT_MIN_MEMBERS:
+            continue
+        members = list(stories_col.find(
+            { "_id": { "$in": story_ids }, "embedding": { "$exists": True } },
+            { "headline": 1, "link": 1, "source": 1, "summary": 1, "updated": 1, "embedding": 1 }
+        ))
+        core = [s for s in members if similarity_score(s['embedding'], topic['centroid']) >= SPLIT_SCORE]
+        outliers = [s for s in members if similarity_score(s['embedding'], topic['centroid']) < SPLIT_SCORE]
+        if not outliers or not core:
+            continue
+        print(f"Splitting {[s['_id'] for s in outliers]} out of {topic['_id']}")
+        if dry_run:
+            split_count += 1
+            continue
+
+        # Only the most recent members go into the summary, as for merges
+        recent = sorted(core, key=lambda s: s['updated'], reverse=True)[:TOPIC_SUMMARY_MAX_STORIES]
+        summary = summarize_stories(recent)
+        if renew_lock is not None and not renew_lock():
+            print("Lost the topic lock, not splitting the remaining topics")
+            break
+
+        # Outliers become single-story topics, the same way the ingest
+        # creates a topic for an article that matched nothing.
+        story_ops = []
+        for s in outliers:
+            new_topic = {k: v for k, v in s.items() if k != '_id'}
+            new_topic.update({ "centroid": s['embedding'], "member_count": 1, "stories": [s['_id']] })
+            new_topic_id = topics_col.insert_one(new_topic).inserted_id
+            story_ops.append(UpdateOne({ "_id": s['_id'] }, { "$set": { "topic": new_topic_id } }))
+            changes.add_topic(new_topic_id)
+        stories_col.bulk_write(story_ops, ordered=False)
+
+        outlier_ids = {s['_id'] for s in outliers}
+        remaining = [s for s in story_ids if s not in outlier_ids]
+        topics_col.update_one({ "_id": topic['_id'] }, { "$set": {
+            "stories": remaining,
+            "summary": summary,
+            "centroid": compute_centroid([s['embedding'] for s in core]),
+            "member_count": len(remaining)
+        } })
+        changes.add_topic(topic['_id'])
+        split_count += 1
+    return split_count
+
+def load_active_topics(topics_col: Collection) -> list[dict]:
+    return list(topics_col.find(
+        { "updated": { "$gte": datetime.now() - ACTIVE_TOPIC_HORIZON }, "centroid": { "$exists": True } },
+        { "centroid": 1, "member_count": 1, "stories": 1, "updated": 1 }
+    ))
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge near-duplicate topics and split incoherent ones.")
+    parser.add_argument('--dry-run', action='store_true', help="Print what would change without writing")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env_path = os.path.join(script_dir, '../.env')
+    print(f"Loading environment variables from {env_path}")
+    load_dotenv(env_path)
+
+    mongo_uri = os.getenv("MONGO_URI")
+    client = MongoClient(mongo_uri)
+    db = client.get_database('nb3000')
+    stories_col = db.get_collection('stories')
+    topics_col = db.get_collection('topics')
+
+    # The ingest runs often and holds the lock briefly, so skip this run
+    # rather than wait for it
+    lock = lock_owner('compact_topics')
+    if not args.dry_run and not acquire_topic_lock(db, lock):
+        print("Ingest is assigning articles to topics, skipping compaction")
+        return
+
+    changes = Changes()
+    try:
+        renew_lock = None if args.dry_run else lambda: acquire_topic_lock(db, lock)
+        merged = merge_topics(load_active_topics(topics_col), stories_col, topics_col, changes, args.dry_run, renew_lock)
+        print(f"Merged {merged} groups of topics")
+        # Reload so splits see the merged centroids and member lists.
+        split = split_topics(load_active_topics(topics_col), stories_col, topics_col, changes, args.dry_run, renew_lock)
+        print(f"Split {split} topics")
+    finally:
+        if not args.dry_run:
+            release_topic_lock(db, lock)
+
+    if (merged or split) and not args.dry_run:
+        write_feed_snapshots(db)
+        write_syndication_feeds(db)
+        bump_data_version(db, datetime.now(), changes)
+
+if __name__ == "__main__":
+    main()
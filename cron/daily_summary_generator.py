@@ -3,7 +3,7 @@ import pytz
 import pprint
 import html
 import traceback
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pymongo.database import Database
 from pymongo.collection import Collection
 
@@ -15,12 +15,72 @@ from llm import (
     DailyNewsSummary
 )
 
+# Staleness policy for the daily briefing. Each regeneration costs several
+# LLM calls over the whole day's stories, so a run only regenerates it when
+# enough has changed since the last one.
+# Never regenerate more often than this...
+SUMMARY_MIN_INTERVAL = timedelta(hours=2)
+# ... and always regenerate once the briefing is this old.
+SUMMARY_MAX_AGE = timedelta(hours=24)
+# In between, regenerate once this many important stories have arrived...
+SUMMARY_IMPORTANT_STORIES = 2
+SUMMARY_IMPORTANCE = 7
+# ... or this many topics have been created or updated.
+SUMMARY_CHANGED_TOPICS = 5
+
+def local_time(utc: datetime) -> datetime:
+    """
+    The ingest stamps run_start_time and topics' updated with the host's
+    local datetime.now(), while summary dates are UTC. Converts a naive UTC
+    time to the local clock for querying those fields.
+    """
+    return utc.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+def daily_summary_due(stories_col: Collection, topics_col: Collection, news_summaries_col: Collection,
+                      now: datetime = None) -> tuple[bool, str]:
+    """
+    Applies the staleness policy above to the latest daily summary. All
+    times are naive UTC, converted with local_time only to query fields
+    written on the local clock.
+
+    Returns:
+        tuple: (whether to regenerate, the reason, for the log)
+    """
+    now = now or datetime.now(pytz.utc).replace(tzinfo=None)
+    latest = news_summaries_col.find_one({}, {"date": 1}, sort=[("date", -1)])
+    if latest is None:
+        return True, "no daily summary yet"
+    # Stored times are naive UTC
+    last = latest['date'].replace(tzinfo=None)
+    age = now - last
+    if age >= SUMMARY_MAX_AGE:
+        return True, f"last summary is {age} old"
+    if age < SUMMARY_MIN_INTERVAL:
+        return False, f"last summary is only {age} old"
+
+    since = local_time(last)
+    important = stories_col.count_documents({
+        # updated bounds the scan with an index; run_start_time is ingest time
+        "updated": { "$gt": since - SUMMARY_MAX_AGE },
+        "run_start_time": { "$gt": since },
+        "summary.importance": { "$gte": SUMMARY_IMPORTANCE }
+    }, limit=SUMMARY_IMPORTANT_STORIES)
+    if important >= SUMMARY_IMPORTANT_STORIES:
+        return True, f"{important} new stories of importance {SUMMARY_IMPORTANCE}+"
+    topics = topics_col.count_documents({ "updated": { "$gt": since } }, limit=SUMMARY_CHANGED_TOPICS)
+    if topics >= SUMMARY_CHANGED_TOPICS:
+        return True, f"{topics} topics changed"
+    return False, f"{important} important stories and {topics} changed topics since the last summary"
+
 def create_and_save_daily_summary(db: Database, stories_col: Collection, topics_col: Collection, news_summaries_col: Collection):
     """
     Simplified daily news summary generation with 3 steps:
     1. Generate text summary with paragraphs
     2. Insert link markers 
     3. Replace markers with HTML links
+
+    Returns:
+        bool: True if a new summary was saved
     """
     print("\nGenerating daily news summary (Simplified 3-step approach)...")
     one_day_ago = datetime.now(pytz.utc) - timedelta(days=1)
@@ -32,7 +92,7 @@ def create_and_save_daily_summary(db: Database, stories_col: Collection, topics_
     
     if not articles_for_summary:
         print("No recent articles found in the last 24 hours to generate a daily summary.")
-        return
+        return False
 
     # Prepare input data for summary generation
     summary_input_data = []
@@ -52,7 +112,7 @@ def create_and_save_daily_summary(db: Database, stories_col: Collection, topics_
         paragraphed_summary = summary_output.get('paragraphed_summary')
         if not paragraphed_summary:
             print("Error: Failed to generate paragraphed summary.")
-            return
+            return False
         
         print("\n\n--------------------------------")
         print(paragraphed_summary)
@@ -141,10 +201,12 @@ def create_and_save_daily_summary(db: Database, stories_col: Collection, topics_
             "date": final_daily_summary_doc['date'],
             "html_summary_snippet": final_html_summary[:300] + "..." 
         })
+        return True
 
     except Exception as e:
         print(f"An error occurred during the simplified daily summary workflow: {e}")
         traceback.print_exc()
+        return False
 
 def convert_markers_to_html(summary_with_markers: str, short_name_to_topic_id_map: dict) -> str:
     """
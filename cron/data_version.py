@@ -0,0 +1,51 @@
+import time
+from datetime import datetime, timedelta
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+from change_log import Changes, change_entry
+
+# A change log entry this old whose version was never published belongs to a
+# run that died in between; its version is published so later runs can go on.
+UNPUBLISHED_ENTRY_TIMEOUT = timedelta(minutes=5)
+
+def bump_data_version(db: Database, run_start_time: datetime, changes: Changes) -> int:
+    """
+    Marks the data served by the web app as changed. The web app keys its
+    caches on this version, so call it once a run's writes are complete.
+
+    The run's change log entry is inserted first, under the next version,
+    and the version is only published once that succeeds. The entry's _id
+    claims the version, so a concurrent run waits for this one to publish
+    before taking the one after, and the change log never has a gap below
+    the published version.
+
+    Returns:
+        int: The new data version
+    """
+    meta = db['meta']
+    while True:
+        doc = meta.find_one({ "_id": "data_version" }) or {}
+        version = doc.get('version', 0) + 1
+        try:
+            db['changes'].insert_one(dict(change_entry(changes), _id=version))
+            break
+        except DuplicateKeyError:
+            claimed = db['changes'].find_one({ "_id": version }, { "time": 1 })
+            if claimed is not None and claimed['time'] < datetime.now() - UNPUBLISHED_ENTRY_TIMEOUT:
+                print(f"Publishing data version {version} left behind by an earlier run")
+                meta.update_one({ "_id": "data_version" }, { "$max": { "version": version } }, upsert=True)
+            else:
+                # Another run is between claiming this version and publishing it
+                time.sleep(1)
+
+    meta.update_one(
+        { "_id": "data_version" },
+        {
+            "$max": { "version": version },
+            "$set": { "run_start_time": run_start_time, "updated": datetime.now() }
+        },
+        upsert=True
+    )
+    print(f"Data version is now {version}, with {len(changes.stories)} stories, {len(changes.topics)} topics "
+          f"and {len(changes.removed_topics)} removed topics in its change log entry")
+    return version
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from pymongo.database import Database
+# The snapshots stand in for the first page of the web app's lists
+from nb3000.listing import PAGE_SIZE as FEED_SIZE, SORT_KEYS, STORY_CARD_PROJECTION, TOPIC_CARD_PROJECTION
+
+def story_feed(db: Database, query: dict, sort: str) -> dict:
+    items = list(db['stories'].find(query, STORY_CARD_PROJECTION).sort(SORT_KEYS[sort]).limit(FEED_SIZE + 1))
+    return { "items": items[:FEED_SIZE], "has_more": len(items) > FEED_SIZE }
+
+def front_page_feed(db: Database) -> dict:
+    horizon = datetime.now() - timedelta(hours=48)
+    topics = list(db['topics'].find(
+        { "updated": { "$gte": horizon }, "merged_into": { "$exists": False } },
+        TOPIC_CARD_PROJECTION
+    ).sort(SORT_KEYS['time']).limit(FEED_SIZE + 1))
+    has_more = len(topics) > FEED_SIZE
+    topics = [t for t in topics[:FEED_SIZE] if t.get('stories')]
+
+    story_ids = list({ s for t in topics for s in t['stories'] })
+    stories = { s['_id']: s for s in db['stories'].find({ "_id": { "$in": story_ids } }, STORY_CARD_PROJECTION) }
+    for t in topics:
+        articles = [stories[s] for s in t['stories'] if s in stories]
+        t['articles'] = sorted(articles, key=lambda a: a['updated'], reverse=True)
+
+    return {
+        "items": topics,
+        "has_more": has_more,
+        "latest_daily_summary": db['news_summaries'].find_one(sort=[('date', -1)])
+    }
+
+def write_feed_snapshots(db: Database):
+    """
+    Writes the first page of the front page, /stories and each top-level
+    category, in both sort orders, to the feeds collection. The web app
+    renders those pages from a single document read.
+    """
+    now = datetime.now()
+    feeds = { "main": front_page_feed(db) }
+
+    day_ago = now - timedelta(days=1)
+    two_weeks_ago = now - timedelta(days=14)
+    categories = [c for c in db['stories'].distinct('summary.categories', { "updated": { "$gt": two_weeks_ago } })
+                  if c and '/' not in c]
+    for sort in SORT_KEYS:
+        feeds[f"stories:{sort}"] = story_feed(db, { "updated": { "$gt": day_ago } }, sort)
+        for c in categories:
+            feeds[f"category/{c}:{sort}"] = story_feed(db, { "updated": { "$gt": two_weeks_ago }, "summary.categories": c }, sort)
+
+    for feed_id, feed in feeds.items():
+        feed['generated'] = now
+        db['feeds'].replace_one({ "_id": feed_id }, feed, upsert=True)
+
+    # Categories that dropped out of the window would otherwise keep a stale snapshot
+    db['feeds'].delete_many({ "_id": { "$nin": list(feeds) } })
+    print(f"Wrote {len(feeds)} feed snapshots")
@@ -0,0 +1,32 @@
+from dotenv import load_dotenv
+import os
+from pymongo import MongoClient
+from main import find_similar_keywords
+
+def main():
+    """
+    Backfill similar_keywords for keywords inserted before the ingest started
+    maintaining it.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env_path = os.path.join(script_dir, '../.env')
+    print(f"Loading environment variables from {env_path}")
+    load_dotenv(env_path)
+
+    mongo_uri = os.getenv("MONGO_URI")
+    client = MongoClient(mongo_uri)
+    db = client.get_database('nb3000')
+    keywords_col = db.get_collection('keywords')
+
+    keywords = keywords_col.find({'similar_keywords': {'$exists': False}}, {'keyword': 1, 'embedding': 1})
+    for k in keywords:
+        if not k.get('embedding'):
+            print(f"Skipping {k['keyword']} because it has no embedding")
+            continue
+        neighbors = find_similar_keywords(k['embedding'], keywords_col)
+        similar_keywords = [k['keyword']] + [n['keyword'] for n in neighbors if n['keyword'] != k['keyword']]
+        print(f"{k['keyword']}: {similar_keywords}")
+        keywords_col.update_one({'_id': k['_id']}, {'$set': {'similar_keywords': similar_keywords}})
+
+if __name__ == "__main__":
+    main()
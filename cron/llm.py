@@ -8,6 +8,10 @@ from pydantic import BaseModel, Field, validator
 from datetime import datetime
 import json # For formatting input to LLMs if needed
 
+# A topic summary is written from at most this many of its stories, the most
+# recent ones, so prompt size and cost stay flat as a topic grows
+TOPIC_SUMMARY_MAX_STORIES = 12
+
 class ArticleSummary(BaseModel):
     title: str = Field(description="Article's title based on the content, unbiased, without spin or clickbait")
     summary: str = Field(description='''Summary, one paragraph summary of the story. Do not preface it with 
@@ -47,6 +51,36 @@ You are an expert journalist capable of analyzing news stories in depth.
     parsed_data = parser.parse(res.content).model_dump()
     return parsed_data
 
+# The model story embeddings are made with. The vector index (story_embed)
+# and stored stories must agree on it; see article_embed.py to change it.
+STORY_EMBEDDING_MODEL = 'text-embedding-3-small'
+STORY_EMBEDDING_DIMENSIONS = 512
+
+def embedding_model_id(model: str, dimensions: int) -> str:
+    """
+    Returns:
+        str: The identifier stored next to an embedding, e.g.
+        'text-embedding-3-small/512'
+    """
+    return f"{model}/{dimensions}"
+
+def get_text_embeddings_batch(texts: List[str], model: str = STORY_EMBEDDING_MODEL,
+                              dimensions: int = STORY_EMBEDDING_DIMENSIONS) -> List[List[float]]:
+    """
+    Get embeddings for many texts with as few API requests as possible.
+
+    Args:
+        texts (list): The texts to generate embeddings for.
+
+    Returns:
+        list: One embedding vector per text, in order.
+    """
+    if model.startswith('text-embedding-3'):
+        embeddings = OpenAIEmbeddings(model=model, dimensions=dimensions)
+    else:
+        embeddings = OpenAIEmbeddings(model=model)
+    return embeddings.embed_documents(texts)
+
 def get_text_embeddings(text: str, model: str = 'text-embedding-ada-002', dimensions: int = 1536) -> List[float]:
     """
     Get embeddings for a given text using OpenAI API.
@@ -72,7 +106,7 @@ def summarize_stories(stories: list[dict]) -> dict:
         stories,
         key=lambda story: (lambda dt_val: dt_val.replace(tzinfo=pytz.UTC) if isinstance(dt_val, datetime) and dt_val.tzinfo is None else dt_val)(story.get('updated', datetime.min.replace(tzinfo=pytz.UTC))),
         reverse=True
-    )
+    )[:TOPIC_SUMMARY_MAX_STORIES]
 
     articles = "\n\n".join(
         f"ARTICLE {i+1}:\n{s['updated'].strftime('%Y-%m-%d %H:%M:%S')}\n{s['headline']}\n{s['summary']['summary']}"
@@ -9,13 +9,18 @@ import json # Added json for stringifying chunks for the new LLM step
 
 from bs4 import BeautifulSoup
 from pymongo.mongo_client import MongoClient
+from pymongo import UpdateOne
 from pymongo.collection import Collection
 from bson import ObjectId
 from datetime import datetime, timedelta
 from llm import (
     summarize_article, 
     get_text_embeddings, 
+    embedding_model_id,
+    STORY_EMBEDDING_MODEL,
+    STORY_EMBEDDING_DIMENSIONS,
     summarize_stories, 
+    TOPIC_SUMMARY_MAX_STORIES,
     generate_simple_daily_summary, # Updated import for simplified approach
     generate_topic_short_name,          
     DailyNewsSummary # For constructing the final object for DB
@@ -24,7 +29,14 @@ from dotenv import load_dotenv
 from csm import ChristianScienceMonitor
 from npr import NPR
 from apnews import AssociatedPress
-from daily_summary_generator import create_and_save_daily_summary # New import
+from daily_summary_generator import create_and_save_daily_summary, daily_summary_due # New import
+from topics import ActiveTopics, similarity_score
+from data_version import bump_data_version
+from change_log import Changes
+from topic_lock import TOPIC_LOCK_LEASE, lock_owner, acquire_topic_lock, release_topic_lock
+from feeds import write_feed_snapshots
+from syndication import write_syndication_feeds
+from search_index import open_index, index_stories
 
 def merge_stories(stories: list[dict], story: dict):
     for s in stories:
@@ -34,6 +46,9 @@ def merge_stories(stories: list[dict], story: dict):
         story['summary'] += "\n\n" + s['summary']
     return story
 
+SIMILAR_STORY_SCORE = 0.9
+SIMILAR_STORIES_LIMIT = 10
+
 def find_similar_stories(embedding: list[float], stories_col: Collection):
     pipeline = [
         {
@@ -60,7 +75,7 @@ def find_similar_stories(embedding: list[float], stories_col: Collection):
         },
         {
             '$match': {
-                'score': { '$gte': 0.9 }
+                'score': { '$gte': SIMILAR_STORY_SCORE }
             }
         },
         {
@@ -73,6 +88,145 @@ def find_similar_stories(embedding: list[float], stories_col: Collection):
     # similar_stories = [s for s in similar_stories if s['_id'] != story['_id']]
     return similar_stories
 
+def similar_story_link(story_id: ObjectId, neighbor_id: ObjectId, score: float) -> UpdateOne:
+    """
+    Adds neighbor_id to a story's precomputed similar_stories, keeping the list
+    sorted by score and capped at SIMILAR_STORIES_LIMIT. Stories that predate
+    similar_stories are left to story_links.py.
+    """
+    return UpdateOne(
+        { "_id": story_id, "similar_stories": { "$exists": True }, "similar_stories._id": { "$ne": neighbor_id } },
+        { "$push": { "similar_stories": {
+            "$each": [{ "_id": neighbor_id, "score": score }],
+            "$sort": { "score": -1 },
+            "$slice": SIMILAR_STORIES_LIMIT
+        } } }
+    )
+
+def find_similar_keywords(embedding: list[float], keywords_col: Collection):
+    pipeline = [
+        {
+            '$vectorSearch': {
+                'index': 'embed_search',
+                'path': 'embedding',
+                'queryVector': embedding,
+                'numCandidates': 100,
+                'limit': 10
+            }
+        },
+        {
+            '$project': {
+                '_id': 1,
+                'keyword': 1,
+                'score': {
+                    '$meta': 'vectorSearchScore'
+                }
+            }
+        },
+        {
+            '$match': {
+                'score': { '$gte': 0.9 }
+            }
+        }
+    ]
+    return list(keywords_col.aggregate(pipeline))
+
+def add_keyword(keyword: str, keywords_col: Collection):
+    """
+    Insert a new keyword along with its precomputed similar-keyword list, and
+    add the new keyword to the lists of its neighbors.
+    """
+    embedding = get_text_embeddings(keyword)
+    neighbors = [k for k in find_similar_keywords(embedding, keywords_col) if k['keyword'] != keyword]
+    similar_keywords = [keyword] + [k['keyword'] for k in neighbors]
+    keywords_col.insert_one({"keyword": keyword, "embedding": embedding, "similar_keywords": similar_keywords})
+    if neighbors:
+        # Keywords that predate similar_keywords are left to keyword_neighbors.py
+        keywords_col.update_many(
+            { "_id": { "$in": [k['_id'] for k in neighbors] }, "similar_keywords": { "$exists": True } },
+            { "$addToSet": { "similar_keywords": keyword } }
+        )
+
+def assign_topics(db, articles: list[dict], changes: Changes, lock: str) -> list[dict]:
+    """
+    Inserts the articles, each into the active topic whose centroid it
+    matches or else into a new topic of its own. Call with the topic lock
+    held (see topic_lock.py); it is renewed as articles are added.
+
+    Returns:
+        list: The articles inserted, with their _id set. Stops short of
+        the full list if the lock is lost.
+    """
+    stories_col = db["stories"]
+    topics_col = db["topics"]
+    # Articles are matched against the centroids of recently active topics
+    # rather than against individual stories.
+    active_topics = ActiveTopics(topics_col)
+    added = []
+    for article in articles:
+        if not acquire_topic_lock(db, lock):
+            # Lease ran out and compaction took over; the rest are picked up next run
+            print("Lost the topic lock, not adding the remaining articles")
+            break
+        topic = None
+        match = active_topics.best_match(article['embedding'])
+        while match is not None and topic is None:
+            topic_id, score = match
+            topic = topics_col.find_one({ "_id": topic_id }, { "stories": 1 })
+            if topic is None:
+                # Deleted since the centroids were loaded; try the next best
+                print(f"matched topic {topic_id} no longer exists")
+                active_topics.remove(topic_id)
+                match = active_topics.best_match(article['embedding'])
+        if topic is not None:
+            print(f"matched topic {topic_id} with score {score:.3f}")
+            # Only the most recent members go into the summary
+            members = list(stories_col.find(
+                { "_id": { "$in": topic.get('stories', []) } },
+                { "headline": 1, "summary": 1, "updated": 1 }
+            ).sort('updated', -1).limit(TOPIC_SUMMARY_MAX_STORIES - 1))
+            summary = summarize_stories(members + [article])
+            article['topic'] = topic_id
+            article_id = stories_col.insert_one(article).inserted_id
+            centroid, member_count = active_topics.join(topic_id, article['embedding'])
+            print(f"summarized topic: {topic_id}")
+            pprint.pprint(summary)
+            topics_col.update_one({ "_id": topic_id }, {
+                "$set": {
+                    "updated": datetime.now(),
+                    "source": "multiple",
+                    "summary": summary,
+                    "centroid": centroid,
+                    "member_count": member_count
+                },
+                "$addToSet": { "stories": article_id }
+            })
+            changes.add_topic(topic_id)
+        else:
+            topic = dict(article, centroid=article['embedding'], member_count=1)
+            topic_id = topics_col.insert_one(topic).inserted_id
+            active_topics.add(topic_id, article['embedding'])
+            article['topic'] = topic_id
+            article_id = stories_col.insert_one(article).inserted_id
+            topics_col.update_one({ "_id": topic_id }, { "$push": { "stories": article_id } })
+            changes.add_topic(topic_id)
+        changes.add_story(article_id)
+        added.append(article)
+    return added
+
+def refresh_daily_summary(db, changes: Changes):
+    """
+    Regenerates the daily summary if the staleness policy in
+    daily_summary_generator.py says enough has changed since the last one.
+    """
+    stories_col, topics_col, news_summaries_col = db["stories"], db["topics"], db["news_summaries"]
+    due, reason = daily_summary_due(stories_col, topics_col, news_summaries_col)
+    if due:
+        print(f"Regenerating daily summary: {reason}")
+        changes.summary = create_and_save_daily_summary(db, stories_col, topics_col, news_summaries_col)
+    else:
+        print(f"Skipping daily summary generation: {reason}")
+
 def fetch_cnn_lite_content():
     # URL for CNN Lite
     url = "https://lite.cnn.com/"
@@ -202,8 +356,9 @@ if __name__ == "__main__":
                 summary['time'] = datetime.now()
         
         embed_text = article['headline'] + "\n\n" + summary['summary']
-        embedding = get_text_embeddings(embed_text, model='text-embedding-3-small', dimensions=512)
+        embedding = get_text_embeddings(embed_text, model=STORY_EMBEDDING_MODEL, dimensions=STORY_EMBEDDING_DIMENSIONS)
         article['embedding'] = embedding
+        article['embedding_model'] = embedding_model_id(STORY_EMBEDDING_MODEL, STORY_EMBEDDING_DIMENSIONS)
         article['summary'] = summary
         article['run_start_time'] = run_start_time
         if article.get('updated') is None:
@@ -225,6 +380,11 @@ if __name__ == "__main__":
 
     if len(processed_articles) == 0:
         print("No new articles to add")
+        # The summary still has to be refreshed once it reaches SUMMARY_MAX_AGE
+        changes = Changes()
+        refresh_daily_summary(db, changes)
+        if not changes.empty():
+            bump_data_version(db, run_start_time, changes)
         exit()
 
     keywords_col = db["keywords"]
@@ -235,46 +395,48 @@ if __name__ == "__main__":
             if k is not None:
                 print(f"Keyword {keyword} already exists")
                 continue
-            embedding = get_text_embeddings(keyword)
-            keywords_col.insert_one({"keyword": keyword, "embedding": embedding})
+            add_keyword(keyword, keywords_col)
  
-    # Add stories and topics
-    topics_col = db["topics"]
+    # Precompute similar-story links so story pages don't need a vector search
     for article in processed_articles:
-        similar_stories = find_similar_stories(article['embedding'], stories_col)
-        # Filter out stories that don't have a topic
-        similar_stories = [s for s in similar_stories if s.get('topic') is not None]
-        if len(similar_stories) > 0:
-            topic_id = similar_stories[0]['topic']
-            summary = summarize_stories(similar_stories + [article])
-            # Make sure all the stories refer to the same topic
-            for a in similar_stories:
-                stories_col.update_one({ "_id": a['_id'] }, { "$set": { "topic": topic_id } })
-            article['topic'] = topic_id
-            article_id = stories_col.insert_one(article).inserted_id
-            ids = list(map(lambda s: s['_id'], similar_stories))
-            pprint.pprint(ids)
-            ids += [article['_id']]
-            pprint.pprint(ids)
-            print(f"summarized topic: {topic_id}")
-            pprint.pprint(summary)
-            pprint.pprint(ids)
-            topics_col.update_one({ "_id": topic_id }, { "$set": 
-                { 
-                    "updated": datetime.now(),
-                    "source": "multiple",
-                    "stories": ids,
-                    "summary": summary
-                } 
-            })
-        else:
-            topic_id = topics_col.insert_one(article).inserted_id
-            article['topic'] = topic_id
-            article_id = stories_col.insert_one(article).inserted_id
-            topics_col.update_one({ "_id": topic_id }, { "$push": { "stories": article_id } })
-    
+        article['similar_stories'] = [
+            { "_id": s['_id'], "score": s['score'] }
+            for s in find_similar_stories(article['embedding'], stories_col)
+        ]
+
+    # Add stories and topics, holding the topic lock so that compaction
+    # doesn't merge or split topics while articles join them
+    changes = Changes()
+    lock = lock_owner('ingest')
+    if not acquire_topic_lock(db, lock, wait=TOPIC_LOCK_LEASE):
+        print("Topic lock still held after waiting a full lease, not adding articles")
+        exit()
+    try:
+        # Only these have an _id; the rest are picked up next run
+        added_articles = assign_topics(db, processed_articles, changes, lock)
+    finally:
+        release_topic_lock(db, lock)
+
+    # Link the new stories to each other, since the vector index may not have
+    # them yet, and refresh older neighbors that now have a closer match.
+    link_updates = []
+    for i, article in enumerate(added_articles):
+        for s in article['similar_stories']:
+            link_updates.append(similar_story_link(s['_id'], article['_id'], s['score']))
+        for other in added_articles[:i]:
+            score = similarity_score(article['embedding'], other['embedding'])
+            if score >= SIMILAR_STORY_SCORE:
+                link_updates.append(similar_story_link(article['_id'], other['_id'], score))
+                link_updates.append(similar_story_link(other['_id'], article['_id'], score))
+    if link_updates:
+        stories_col.bulk_write(link_updates, ordered=False)
+
+    search_index = open_index()
+    print(f"Indexed {index_stories(search_index, added_articles)} stories for search")
+    search_index.close()
+
     print("\nAdded articles:")
-    for article in processed_articles:
+    for article in added_articles:
         print("\n" + "="*80)
         print(f"IMPORTANCE: {article['summary'].get('importance', 'N/A')}/10")
         print(f"HEADLINE: {article['headline']}")
@@ -284,11 +446,11 @@ if __name__ == "__main__":
         print(f"CATEGORY: {article['summary'].get('category', 'N/A')}")
         print(f"KEYWORDS: {', '.join(article['summary'].get('keywords', []))}")
         
-    # Call the refactored daily news summary generation function
-    if processed_articles: # Only run if there were new articles processed in this run
-        create_and_save_daily_summary(db, stories_col, topics_col, news_summaries_col)
-    else:
-        print("Skipping daily summary generation as no new articles were processed in this run.")
+    refresh_daily_summary(db, changes)
+
+    write_feed_snapshots(db)
+    write_syndication_feeds(db)
+    bump_data_version(db, run_start_time, changes)
 
     # The process_keyword function might need db and keywords_col passed if it were part of a class
     # For now, as a standalone, it relies on global `db` and `keywords_col` if they were defined globally before main.
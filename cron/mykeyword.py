@@ -1,59 +1,214 @@
 import os
+import re
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from datetime import datetime
+from pymongo import MongoClient, UpdateMany, UpdateOne
+from pymongo.collection import Collection
 import wikipedia
 
-model = ChatOpenAI(model="gpt-4o-mini")
+# Wikipedia misses are retried after this long, in case the page appears
+NEGATIVE_CACHE_TTL = timedelta(days=30)
+# Failed lookups (network errors, bad responses) are retried after this long
+ERROR_CACHE_TTL = timedelta(hours=1)
 
-def anaylize_place(keyword: str) -> any:
-    return wikipedia.summary(keyword, sentences=10)
+class Classification(BaseModel):
+    proper_noun: bool = Field(description="Is the keyword a proper noun?")
+    obscure: bool = Field(
+        description="Does the keyword refer to an obscure term or entity?"
+    )
+    is_person: bool = Field(
+        description="Does the keyword refer to a person?"
+    )
+    is_place: bool = Field(
+        description="Does the keyword refer to a place?"
+    )
+    is_thing: bool = Field(
+        description="Does the keyword refer to a thing?"
+    )
+    is_abstract: bool = Field(
+        description="Does the keyword refer to an abstract concept?"
+    )
+    is_organization: bool = Field(
+        description="Does the keyword refer to an organization?"
+    )
+
+class KeywordClassification(Classification):
+    keyword: str = Field(description="The keyword, exactly as given")
+
+class KeywordClassifications(BaseModel):
+    keywords: List[KeywordClassification] = Field(description="One entry per given keyword")
+
+tagging_prompt = ChatPromptTemplate.from_template(
+"""
+You are given a list of keywords, one per line. Extract the desired information about each keyword.
+
+Only extract the properties mentioned in the 'KeywordClassifications' function, and return one entry
+for every keyword.
+
+Keywords:
+{keywords}
+"""
+)
 
-def analyze_keyword(keyword: str) -> any:
-    tagging_prompt = ChatPromptTemplate.from_template(
+classifier = ChatOpenAI(temperature=0, model="gpt-4o-mini").with_structured_output(KeywordClassifications)
+
+def normalize_keyword(keyword: str) -> str:
+    """
+    Keywords that differ only in case or spacing are analyzed once.
+    """
+    return re.sub(r'\s+', ' ', keyword).strip().casefold()
+
+class Throttle:
+    """
+    Spaces calls out to at most `per_minute` per minute across threads.
     """
-    You are give a keyword. Extract the desired information about the keyword.
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute
+        self.next_time = 0.0
+        self.lock = threading.Lock()
 
-    Only extract the properties mentioned in the 'Classification' function.
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
 
-    Keyword:
-    {keyword}
+def cached_classifications(keys: List[str], classification_col: Collection) -> dict[str, Classification]:
     """
-    )
+    Classifications saved by earlier runs, so a keyword that comes back in
+    another case or spacing isn't sent to the model again.
 
-    class Classification(BaseModel):
-        proper_noun: bool = Field(description="Is the keyword a proper noun?")
-        obscure: bool = Field(
-            description="Does the keyword refer to an obscure term or entity?"
-        )
-        is_person: bool = Field(
-            description="Does the keyword refer to a person?"
-        )
-        is_place: bool = Field(
-            description="Does the keyword refer to a place?"
-        )
-        is_thing: bool = Field(
-            description="Does the keyword refer to a thing?"
-        )
-        is_abstract: bool = Field(
-            description="Does the keyword refer to an abstract concept?"
-        )
-        is_organization: bool = Field(
-            description="Does the keyword refer to an organization?"
-        )
-
-
-    llm = ChatOpenAI(temperature=0, model="gpt-4o-mini").with_structured_output(
-        Classification
-    )
+    Args:
+        keys: Normalized keywords
 
-    response = llm.invoke(tagging_prompt.invoke({"keyword": keyword}))
-    return response
+    Returns:
+        dict: Normalized keyword -> Classification, for those already known
+    """
+    return {
+        doc['_id']: Classification(**doc['analysis'])
+        for doc in classification_col.find({'_id': {'$in': keys}})
+    }
+
+def save_classifications(classifications: dict[str, Classification], classification_col: Collection):
+    if not classifications:
+        return
+    now = datetime.now()
+    classification_col.bulk_write([
+        UpdateOne({'_id': key}, {'$set': {'analysis': c.model_dump(), 'classified': now}}, upsert=True)
+        for key, c in classifications.items()
+    ], ordered=False)
+
+def classify_keywords(keywords: List[str], throttle: Throttle) -> dict[str, Classification]:
+    """
+    Classifies a batch of keywords with one structured LLM call.
+
+    Returns:
+        dict: Normalized keyword -> Classification. Keywords the model left
+        out are missing and are retried on the next run.
+    """
+    throttle.wait()
+    response = classifier.invoke(tagging_prompt.invoke({"keywords": "\n".join(keywords)}))
+    wanted = {normalize_keyword(k) for k in keywords}
+    results = {}
+    for item in response.keywords:
+        key = normalize_keyword(item.keyword)
+        if key in wanted:
+            results[key] = Classification(**item.model_dump(exclude={'keyword'}))
+    return results
+
+def lookup_wikipedia(keyword: str, cache_col: Collection, throttle: Throttle) -> Optional[dict]:
+    """
+    Looks the keyword up on Wikipedia, through a cache in Mongo. Misses
+    (PageError, DisambiguationError) are cached too, for NEGATIVE_CACHE_TTL,
+    and any other failure for ERROR_CACHE_TTL, so one bad lookup doesn't
+    cost the rest of the batch.
+
+    Returns:
+        dict: summary, url and image_url, or None if there is no page or
+        the lookup failed
+    """
+    key = normalize_keyword(keyword)
+    cached = cache_col.find_one({'_id': key})
+    if cached is not None:
+        ttl = ERROR_CACHE_TTL if cached.get('error') == 'lookup' else NEGATIVE_CACHE_TTL
+        if cached.get('page') or cached['fetched'] > datetime.now() - ttl:
+            return cached.get('page')
+
+    throttle.wait()
+    entry = {'fetched': datetime.now(), 'page': None}
+    try:
+        p = wikipedia.page(keyword)
+        entry['page'] = {
+            'summary': p.summary,
+            'url': p.url,
+            'image_url': p.images[0] if p.images else None
+        }
+    except wikipedia.exceptions.PageError as e:
+        print(f"PageError: {e}")
+        entry['error'] = 'page'
+    except wikipedia.exceptions.DisambiguationError as e:
+        print(f"DisambiguationError: {keyword}")
+        entry['error'] = 'disambiguation'
+    except Exception as e:
+        print(f"Error looking up {keyword} on Wikipedia: {e!r}")
+        entry['error'] = 'lookup'
+    cache_col.replace_one({'_id': key}, entry, upsert=True)
+    return entry['page']
+
+def analyze_batch(groups: dict[str, list], keywords_col: Collection, cache_col: Collection,
+                  classification_col: Collection, llm_throttle: Throttle, wiki_throttle: Throttle) -> int:
+    """
+    Classifies and enriches one batch of keyword groups and writes the
+    results with a single bulk_write. Only keywords no earlier run has
+    classified go to the model.
+
+    Args:
+        groups: Normalized keyword -> the keyword documents that share it
+
+    Returns:
+        int: Number of keyword documents updated
+    """
+    classifications = cached_classifications(list(groups), classification_col)
+    names = [docs[0]['keyword'] for key, docs in groups.items() if key not in classifications]
+    if names:
+        new = classify_keywords(names, llm_throttle)
+        save_classifications(new, classification_col)
+        classifications.update(new)
+    ops = []
+    now = datetime.now()
+    for key, classification in classifications.items():
+        docs = groups[key]
+        info = {'analyzed': now, 'analysis': classification.model_dump()}
+        if classification.proper_noun:
+            page = lookup_wikipedia(docs[0]['keyword'], cache_col, wiki_throttle)
+            if page:
+                info['wikipedia'] = page
+        ids = [d['_id'] for d in docs]
+        ops.append(UpdateOne({'_id': ids[0]}, {'$set': info}) if len(ids) == 1
+                   else UpdateMany({'_id': {'$in': ids}}, {'$set': info}))
+    if ops:
+        keywords_col.bulk_write(ops, ordered=False)
+    return sum(len(groups[key]) for key in classifications)
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify new keywords and enrich proper nouns from Wikipedia.")
+    parser.add_argument('--batch-size', type=int, default=50, help="Keywords per classification call")
+    parser.add_argument('--workers', type=int, default=4, help="Batches processed concurrently")
+    parser.add_argument('--llm-per-minute', type=float, default=60, help="Classification calls per minute")
+    parser.add_argument('--wikipedia-per-minute', type=float, default=120, help="Wikipedia lookups per minute")
+    parser.add_argument('--limit', type=int, default=0, help="Analyze at most this many keywords")
+    args = parser.parse_args()
 
-if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.abspath(__file__))
     env_path = os.path.join(script_dir, '../.env')
     print(f"Loading environment variables from {env_path}")
@@ -63,27 +218,30 @@ if __name__ == "__main__":
     client = MongoClient(mongo_uri)
     db = client.get_database('nb3000')
     keywords_col = db.get_collection('keywords')
-    
-    keywords = keywords_col.find({'analyzed': {'$exists': False}})
-    for k in keywords:
-        print(f"Analyzing {k['keyword']}")
-        r = analyze_keyword(k['keyword'])
-        info = {
-            'analyzed': datetime.now(),
-            'analysis': r.model_dump()
-        }
-        if r.proper_noun:
-            try:
-                p = wikipedia.page(k['keyword'])
-                info['wikipedia'] = {
-                    'summary': p.summary,
-                    'url': p.url,
-                    'image_url': p.images[0] if p.images else None
-                }
-            except wikipedia.exceptions.PageError as e:
-                print(f"PageError: {e}")
-            except wikipedia.exceptions.DisambiguationError as e:
-                print(f"DisambiguationError: {e}")
-                
-        keywords_col.update_one({'_id': k['_id']}, {'$set': info})
-    
\ No newline at end of file
+    cache_col = db.get_collection('wikipedia_cache')
+    classification_col = db.get_collection('keyword_classifications')
+
+    groups = {}
+    for k in keywords_col.find({'analyzed': {'$exists': False}}, {'keyword': 1}).limit(args.limit):
+        groups.setdefault(normalize_keyword(k['keyword']), []).append(k)
+    keys = list(groups)
+    batches = [{key: groups[key] for key in keys[i:i + args.batch_size]} for i in range(0, len(keys), args.batch_size)]
+    print(f"Analyzing {sum(len(g) for g in groups.values())} keywords ({len(keys)} distinct) in {len(batches)} batches")
+
+    llm_throttle = Throttle(args.llm_per_minute)
+    wiki_throttle = Throttle(args.wikipedia_per_minute)
+
+    def run(batch):
+        try:
+            return analyze_batch(batch, keywords_col, cache_col, classification_col, llm_throttle, wiki_throttle)
+        except Exception as e:
+            # Unanalyzed keywords are picked up again by the next run
+            print(f"Error analyzing batch starting with {next(iter(batch))}: {e}")
+            return 0
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        updated = sum(pool.map(run, batches))
+    print(f"Analyzed {updated} keywords")
+
+if __name__ == "__main__":
+    main()
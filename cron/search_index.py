@@ -0,0 +1,131 @@
+from dotenv import load_dotenv
+import os
+import sys
+import sqlite3
+from datetime import datetime
+from typing import Iterable
+from pymongo import MongoClient
+
+# Shared with the web app (web/search.py), which opens it read-only.
+# SEARCH_DB overrides the location.
+DEFAULT_SEARCH_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'search.db')
+
+# Only what the index needs from a story
+SEARCH_PROJECTION = {
+    'headline': 1,
+    'updated': 1,
+    'summary.title': 1,
+    'summary.summary': 1,
+    'summary.keywords': 1,
+    'summary.importance': 1,
+}
+
+SCHEMA = [
+    # Sort keys, and the story each index row belongs to
+    """CREATE TABLE IF NOT EXISTS docs (
+        id INTEGER PRIMARY KEY,
+        story_id TEXT UNIQUE NOT NULL,
+        updated TEXT,
+        importance INTEGER
+    )""",
+    # Contentless: only the inverted index is stored, not the text, which
+    # roughly halves the file. Rows share their rowid with docs.id.
+    """CREATE VIRTUAL TABLE IF NOT EXISTS terms USING fts5(
+        headline, title, summary, keywords,
+        content = '',
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )""",
+]
+
+BATCH_SIZE = 500
+
+def search_db_path() -> str:
+    return os.getenv('SEARCH_DB') or DEFAULT_SEARCH_DB
+
+def open_index(path: str = None) -> sqlite3.Connection:
+    path = path or search_db_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    # Readers in the web app keep working while the ingest writes
+    conn.execute('PRAGMA journal_mode=WAL')
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+def index_stories(conn: sqlite3.Connection, stories: Iterable[dict]) -> int:
+    """
+    Adds stories to the search index. Stories already in the index are
+    skipped; a story's text doesn't change after ingest, and rebuild() picks
+    up any edits.
+
+    Returns:
+        int: Number of stories added
+    """
+    count = 0
+    with conn:
+        for story in stories:
+            summary = story.get('summary') or {}
+            updated = story.get('updated')
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO docs (story_id, updated, importance) VALUES (?, ?, ?)',
+                (str(story['_id']), updated.isoformat() if isinstance(updated, datetime) else '',
+                 summary.get('importance', 0))
+            )
+            if cursor.rowcount == 0:
+                continue
+            conn.execute('INSERT INTO terms (rowid, headline, title, summary, keywords) VALUES (?, ?, ?, ?, ?)', (
+                cursor.lastrowid,
+                story.get('headline') or '',
+                summary.get('title') or '',
+                summary.get('summary') or '',
+                ' '.join(summary.get('keywords') or []),
+            ))
+            count += 1
+    return count
+
+def rebuild(conn: sqlite3.Connection, stories_col) -> int:
+    """
+    Reindexes every story from scratch and merges the index into as few
+    b-trees as possible, which makes it both smaller and faster to query.
+
+    Returns:
+        int: Number of stories indexed
+    """
+    with conn:
+        conn.execute('DELETE FROM docs')
+        conn.execute("INSERT INTO terms (terms) VALUES ('delete-all')")
+    count = 0
+    batch = []
+    for story in stories_col.find({}, SEARCH_PROJECTION):
+        batch.append(story)
+        if len(batch) == BATCH_SIZE:
+            count += index_stories(conn, batch)
+            batch = []
+            print(f"Indexed {count} stories")
+    count += index_stories(conn, batch)
+    with conn:
+        conn.execute("INSERT INTO terms (terms) VALUES ('optimize')")
+    conn.execute('VACUUM')
+    return count
+
+def main():
+    """
+    Build the story search index from all stories in the database. The
+    ingest keeps it up to date afterwards.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env_path = os.path.join(script_dir, '../.env')
+    print(f"Loading environment variables from {env_path}")
+    load_dotenv(env_path)
+
+    mongo_uri = os.getenv("MONGO_URI")
+    client = MongoClient(mongo_uri)
+    db = client.get_database('nb3000')
+    path = sys.argv[1] if len(sys.argv) > 1 else search_db_path()
+
+    conn = open_index(path)
+    count = rebuild(conn, db['stories'])
+    print(f"Indexed {count} stories into {path} ({os.path.getsize(path) // 1024} KB)")
+
+if __name__ == "__main__":
+    main()
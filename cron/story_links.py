@@ -0,0 +1,35 @@
+from dotenv import load_dotenv
+import os
+from pymongo import MongoClient
+from main import find_similar_stories
+
+def main():
+    """
+    Backfill similar_stories for stories inserted before the ingest started
+    maintaining it.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env_path = os.path.join(script_dir, '../.env')
+    print(f"Loading environment variables from {env_path}")
+    load_dotenv(env_path)
+
+    mongo_uri = os.getenv("MONGO_URI")
+    client = MongoClient(mongo_uri)
+    db = client.get_database('nb3000')
+    stories_col = db.get_collection('stories')
+
+    stories = stories_col.find({'similar_stories': {'$exists': False}}, {'headline': 1, 'embedding': 1})
+    for story in stories:
+        if not story.get('embedding'):
+            print(f"Skipping {story['headline']} because it has no embedding")
+            continue
+        similar_stories = [
+            {'_id': s['_id'], 'score': s['score']}
+            for s in find_similar_stories(story['embedding'], stories_col)
+            if s['_id'] != story['_id']
+        ]
+        print(f"{story['headline']}: {len(similar_stories)} similar stories")
+        stories_col.update_one({'_id': story['_id']}, {'$set': {'similar_stories': similar_stories}})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Dict, List
+from xml.sax.saxutils import escape, quoteattr
+from pymongo.database import Database
+from feeds import FEED_SIZE, STORY_CARD_PROJECTION, story_feed
+
+# Served by the web app under /feeds/ (web/flask_app.py). FEEDS_DIR overrides
+# the location and SITE_URL the host that entries link to.
+DEFAULT_FEEDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'feeds')
+DEFAULT_SITE_URL = 'https://www.newsbot3000.com'
+
+FEED_FORMATS = ('atom', 'rss')
+
+def feed_name(kind: str, key: str = '') -> str:
+    """
+    Returns:
+        str: The path of a feed under the feeds directory, without extension,
+        e.g. 'stories', 'category/World/Europe' or 'topic/<id>'
+    """
+    return f"{kind}/{key}" if key else kind
+
+def _safe_path(key: str) -> bool:
+    # Category names come from the LLM; keep them inside the feeds directory
+    return all(part not in ('', '.', '..') for part in key.split('/'))
+
+def _utc(dt: datetime) -> datetime:
+    # Stored times are naive UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+def _atom_time(dt: datetime) -> str:
+    return _utc(dt).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _entry(story: dict, site_url: str) -> dict:
+    summary = story.get('summary') or {}
+    return {
+        'url': f"{site_url}/story/{story['_id']}",
+        'title': summary.get('title') or story.get('headline') or '',
+        'summary': summary.get('summary') or '',
+        'source': story.get('source') or '',
+        'updated': story.get('updated') or datetime(1970, 1, 1),
+    }
+
+def render_atom(title: str, url: str, self_url: str, entries: List[dict]) -> str:
+    # The feed's updated time comes from its entries, so unchanged entries
+    # render to identical bytes
+    updated = max((e['updated'] for e in entries), default=datetime(1970, 1, 1))
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n',
+        '<feed xmlns="http://www.w3.org/2005/Atom">\n',
+        f'<title>{escape(title)}</title>\n',
+        f'<id>{escape(self_url)}</id>\n',
+        f'<link href={quoteattr(url)}/>\n',
+        f'<link rel="self" href={quoteattr(self_url)}/>\n',
+        f'<updated>{_atom_time(updated)}</updated>\n',
+    ]
+    for e in entries:
+        parts.append(
+            '<entry>'
+            f'<title>{escape(e["title"])}</title>'
+            f'<id>{escape(e["url"])}</id>'
+            f'<link href={quoteattr(e["url"])}/>'
+            f'<updated>{_atom_time(e["updated"])}</updated>'
+            f'<author><name>{escape(e["source"] or "NewsBot 3000")}</name></author>'
+            f'<summary>{escape(e["summary"])}</summary>'
+            '</entry>\n'
+        )
+    parts.append('</feed>\n')
+    return ''.join(parts)
+
+def render_rss(title: str, url: str, self_url: str, entries: List[dict]) -> str:
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n',
+        '<rss version="2.0"><channel>\n',
+        f'<title>{escape(title)}</title>\n',
+        f'<link>{escape(url)}</link>\n',
+        f'<description>{escape(title)}</description>\n',
+    ]
+    for e in entries:
+        parts.append(
+            '<item>'
+            f'<title>{escape(e["title"])}</title>'
+            f'<link>{escape(e["url"])}</link>'
+            f'<guid isPermaLink="true">{escape(e["url"])}</guid>'
+            f'<pubDate>{format_datetime(_utc(e["updated"]))}</pubDate>'
+            f'<description>{escape(e["summary"])}</description>'
+            '</item>\n'
+        )
+    parts.append('</channel></rss>\n')
+    return ''.join(parts)
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """
+    Replaces the file at path with data unless it already holds exactly
+    that. Unchanged files keep their mtime, and with it the ETag and
+    Last-Modified the web app serves them with.
+
+    Returns:
+        bool: Whether the file was written
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    # Readers see either the old file or the new one
+    os.replace(tmp, path)
+    return True
+
+def syndication_feeds(db: Database) -> Dict[str, tuple]:
+    """
+    Returns:
+        dict: Feed name -> (title, page path, stories), for the latest
+        stories, every category prefix and every active topic
+    """
+    now = datetime.now()
+    two_weeks_ago = now - timedelta(days=14)
+    feeds = {
+        feed_name('stories'): ('NewsBot 3000', '/stories', story_feed(db, { "updated": { "$gt": two_weeks_ago } }, 'time')['items'])
+    }
+
+    for c in db['stories'].distinct('summary.categories', { "updated": { "$gt": two_weeks_ago } }):
+        if not c or not _safe_path(c):
+            continue
+        stories = story_feed(db, { "updated": { "$gt": two_weeks_ago }, "summary.categories": c }, 'time')['items']
+        feeds[feed_name('category', c)] = (f'NewsBot 3000: {c}', f'/category/{c}', stories)
+
+    topics = db['topics'].find(
+        { "updated": { "$gte": now - timedelta(hours=48) }, "merged_into": { "$exists": False } },
+        { "summary.title": 1, "stories": 1 }
+    )
+    for t in topics:
+        if not t.get('stories'):
+            continue
+        stories = list(db['stories'].find({ "_id": { "$in": t['stories'] } }, STORY_CARD_PROJECTION)
+                       .sort('updated', -1).limit(FEED_SIZE))
+        title = (t.get('summary') or {}).get('title') or 'Topic'
+        feeds[feed_name('topic', str(t['_id']))] = (f'NewsBot 3000: {title}', f"/topic/{t['_id']}", stories)
+    return feeds
+
+def write_syndication_feeds(db: Database):
+    """
+    Writes an Atom and an RSS file for the latest stories, each category
+    prefix and each active topic, rewriting only those whose content changed,
+    and removes files for categories and topics that are no longer active.
+    """
+    feeds_dir = os.getenv('FEEDS_DIR') or DEFAULT_FEEDS_DIR
+    site_url = (os.getenv('SITE_URL') or DEFAULT_SITE_URL).rstrip('/')
+    renderers = { 'atom': render_atom, 'rss': render_rss }
+
+    current = set()
+    written = 0
+    for name, (title, page_path, stories) in syndication_feeds(db).items():
+        entries = [_entry(s, site_url) for s in stories]
+        for fmt in FEED_FORMATS:
+            path = os.path.join(feeds_dir, f'{name}.{fmt}')
+            current.add(os.path.normpath(path))
+            body = renderers[fmt](title, site_url + page_path, f'{site_url}/feeds/{name}.{fmt}', entries)
+            written += write_if_changed(path, body.encode('utf-8'))
+
+    removed = 0
+    for root, _, files in os.walk(feeds_dir):
+        for f in files:
+            path = os.path.normpath(os.path.join(root, f))
+            if path not in current:
+                os.remove(path)
+                removed += 1
+    print(f"Syndication feeds: {len(current)} files, {written} rewritten, {removed} removed")
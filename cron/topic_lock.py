@@ -0,0 +1,49 @@
+import os
+import time
+import socket
+from datetime import datetime, timedelta
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+# The ingest assigns articles to topics from centroids and member lists it
+# read earlier, and compaction rewrites those lists and marks absorbed topics
+# merged_into. Either job doing that under the other's feet loses stories, so
+# both hold this lease in meta while they touch topics.
+TOPIC_LOCK_ID = 'topic_lock'
+# A crashed holder blocks the other job for at most this long
+TOPIC_LOCK_LEASE = timedelta(minutes=30)
+
+def lock_owner(job: str) -> str:
+    return f"{job}:{socket.gethostname()}:{os.getpid()}"
+
+def acquire_topic_lock(db: Database, owner: str, wait: timedelta = timedelta(0),
+                       lease: timedelta = TOPIC_LOCK_LEASE) -> bool:
+    """
+    Takes, or renews, the lease on topic assignment. The lease is free if
+    nobody holds it or the holder's lease has run out.
+
+    Args:
+        owner: Identifies the holder, see lock_owner
+        wait: How long to keep retrying while another job holds it
+
+    Returns:
+        bool: Whether owner now holds the lease
+    """
+    deadline = time.monotonic() + wait.total_seconds()
+    while True:
+        now = datetime.now()
+        try:
+            db['meta'].update_one(
+                { "_id": TOPIC_LOCK_ID, "$or": [{ "owner": owner }, { "expires": { "$lt": now } }] },
+                { "$set": { "owner": owner, "expires": now + lease } },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Held by someone else: the filter missed and the upsert collided
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(5)
+
+def release_topic_lock(db: Database, owner: str):
+    db['meta'].delete_one({ "_id": TOPIC_LOCK_ID, "owner": owner })
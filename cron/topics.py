@@ -0,0 +1,114 @@
+import math
+from dotenv import load_dotenv
+import os
+from datetime import datetime, timedelta
+from pymongo import MongoClient, UpdateOne
+from pymongo.collection import Collection
+
+# Topics updated within this window are candidates for new articles.
+ACTIVE_TOPIC_HORIZON = timedelta(hours=48)
+# Same threshold the story vector search uses.
+TOPIC_MATCH_SCORE = 0.9
+
+def similarity_score(a: list[float], b: list[float]) -> float:
+    """
+    Cosine similarity mapped to [0, 1] the same way Atlas reports
+    vectorSearchScore for cosine indexes, so thresholds are interchangeable.
+    """
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    if norm == 0:
+        return 0.0
+    return (1 + dot / norm) / 2
+
+def merge_centroids(centroid: list[float], count: int, other: list[float], other_count: int = 1) -> list[float]:
+    """
+    Weighted mean of two centroids (an embedding is a centroid of count 1).
+    """
+    total = count + other_count
+    return [(x * count + y * other_count) / total for x, y in zip(centroid, other)]
+
+class ActiveTopics:
+    """
+    In-memory set of recently updated topic centroids, used to assign new
+    articles to topics without a vector search over all stories.
+    """
+    def __init__(self, topics_col: Collection, horizon: timedelta = ACTIVE_TOPIC_HORIZON):
+        self.topics = {}
+        cursor = topics_col.find(
+            { "updated": { "$gte": datetime.now() - horizon }, "centroid": { "$exists": True } },
+            { "centroid": 1, "member_count": 1 }
+        )
+        for t in cursor:
+            self.topics[t['_id']] = (t['centroid'], t.get('member_count', 1))
+
+    def best_match(self, embedding: list[float], min_score: float = TOPIC_MATCH_SCORE):
+        """
+        Returns (topic_id, score) for the closest centroid at or above min_score,
+        or None.
+        """
+        best = None
+        for topic_id, (centroid, _) in self.topics.items():
+            score = similarity_score(embedding, centroid)
+            if score >= min_score and (best is None or score > best[1]):
+                best = (topic_id, score)
+        return best
+
+    def add(self, topic_id, centroid: list[float], member_count: int = 1):
+        self.topics[topic_id] = (centroid, member_count)
+
+    def remove(self, topic_id):
+        self.topics.pop(topic_id, None)
+
+    def join(self, topic_id, embedding: list[float]):
+        """
+        Folds an embedding into the topic's centroid. Returns the new
+        (centroid, member_count) so the caller can persist it.
+        """
+        centroid, count = self.topics[topic_id]
+        centroid = merge_centroids(centroid, count, embedding)
+        self.topics[topic_id] = (centroid, count + 1)
+        return self.topics[topic_id]
+
+def compute_centroid(embeddings: list[list[float]]) -> list[float]:
+    centroid, count = embeddings[0], 1
+    for e in embeddings[1:]:
+        centroid = merge_centroids(centroid, count, e)
+        count += 1
+    return centroid
+
+def main():
+    """
+    Backfill centroid and member_count for active topics created before the
+    ingest started maintaining them.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env_path = os.path.join(script_dir, '../.env')
+    print(f"Loading environment variables from {env_path}")
+    load_dotenv(env_path)
+
+    mongo_uri = os.getenv("MONGO_URI")
+    client = MongoClient(mongo_uri)
+    db = client.get_database('nb3000')
+    stories_col = db.get_collection('stories')
+    topics_col = db.get_collection('topics')
+
+    horizon = datetime.now() - ACTIVE_TOPIC_HORIZON
+    topics = topics_col.find({ "updated": { "$gte": horizon }, "centroid": { "$exists": False } }, { "stories": 1 })
+    updates = []
+    for t in topics:
+        stories = stories_col.find({ "_id": { "$in": t.get('stories', []) } }, { "embedding": 1 })
+        embeddings = [s['embedding'] for s in stories if s.get('embedding')]
+        if not embeddings:
+            print(f"Skipping topic {t['_id']} because none of its stories have embeddings")
+            continue
+        updates.append(UpdateOne({ "_id": t['_id'] }, { "$set": {
+            "centroid": compute_centroid(embeddings),
+            "member_count": len(embeddings)
+        } }))
+    if updates:
+        result = topics_col.bulk_write(updates, ordered=False)
+        print(f"Updated {result.modified_count} topics")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# How the story and topic lists are paged and ordered, and which fields a
+# card needs. The web app renders these lists and the ingest precomputes
+# their first pages (cron/feeds.py), so both import them from here.
+
+PAGE_SIZE = 30
+
+# Keyset orderings. Every ordering ends in _id so that positions are unique.
+SORT_KEYS = {
+    'time': [('updated', -1), ('_id', -1)],
+    'importance': [('summary.importance', -1), ('updated', -1), ('_id', -1)],
+}
+
+# Only the fields the templates render. In particular, never fetch the
+# 512-dim embedding for a page.
+STORY_CARD_PROJECTION = {
+    'headline': 1,
+    'link': 1,
+    'source': 1,
+    'updated': 1,
+    'run_start_time': 1,
+    'summary.title': 1,
+    'summary.summary': 1,
+    'summary.importance': 1,
+    'summary.keywords': 1,
+    'summary.category': 1,
+}
+
+TOPIC_CARD_PROJECTION = {
+    'updated': 1,
+    'source': 1,
+    'stories': 1,
+    'merged_into': 1,
+    'summary.title': 1,
+    'summary.summary': 1,
+    'summary.importance': 1,
+    'summary.keywords': 1,
+    'summary.category': 1,
+}
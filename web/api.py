@@ -0,0 +1,184 @@
+import json
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple, Optional
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+API_MIMETYPE = 'application/json'
+
+SUMMARY_PROJECTION = {
+    'date': 1,
+    'title': 1,
+    'overall_summary': 1,
+    'top_keywords': 1,
+    'key_story_titles': 1,
+    'sentiment': 1,
+}
+
+# Change log entries (written by cron/change_log.py) expire after this long
+CHANGE_LOG_RETENTION = timedelta(days=14)
+# Data versions merged into one /api/v1/changes response
+MAX_CHANGE_ENTRIES = 50
+
+class ChangeSet(NamedTuple):
+    stories: list
+    topics: list
+    removed_topics: dict
+    summary: bool
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() if isinstance(dt, datetime) else None
+
+def dumps(obj) -> bytes:
+    """
+    Serializes obj as compact JSON, with orjson if it's installed. Values
+    must already be JSON types; the *_json helpers below convert documents.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+def json_response(obj, status: int = 200, response_class=Response):
+    # async_app passes Quart's Response
+    return response_class(dumps(obj), status=status, mimetype=API_MIMETYPE)
+
+def story_json(story: dict) -> dict:
+    """
+    Args:
+        story: A story document with at least the STORY_CARD_PROJECTION fields
+    """
+    summary = story.get('summary') or {}
+    return {
+        'id': str(story['_id']),
+        'headline': story.get('headline'),
+        'title': summary.get('title'),
+        'summary': summary.get('summary'),
+        'importance': summary.get('importance', 0),
+        'keywords': summary.get('keywords') or [],
+        'category': summary.get('category'),
+        'source': story.get('source'),
+        'link': story.get('link'),
+        'updated': _iso(story.get('updated')),
+    }
+
+def topic_json(topic: dict, articles: List[dict]) -> dict:
+    """
+    Args:
+        topic: A topic document with at least the TOPIC_CARD_PROJECTION fields
+        articles: The topic's story documents
+    """
+    summary = topic.get('summary') or {}
+    return {
+        'id': str(topic['_id']),
+        'title': summary.get('title'),
+        'summary': summary.get('summary'),
+        'importance': summary.get('importance', 0),
+        'keywords': summary.get('keywords') or [],
+        'category': summary.get('category'),
+        'source': topic.get('source'),
+        'updated': _iso(topic.get('updated')),
+        'stories': [story_json(a) for a in articles],
+    }
+
+def summary_json(summary: dict) -> dict:
+    """
+    Args:
+        summary: A daily summary document from news_summaries
+    """
+    return {
+        'id': str(summary['_id']),
+        'date': _iso(summary.get('date')),
+        'title': summary.get('title'),
+        'summary_html': summary.get('overall_summary'),
+        'sentiment': summary.get('sentiment'),
+        'top_keywords': summary.get('top_keywords') or [],
+        'key_story_titles': summary.get('key_story_titles') or [],
+    }
+
+def story_page_json(page) -> dict:
+    """
+    Args:
+        page: A pagination.Page of story documents
+    """
+    return {
+        'stories': [story_json(story) for story in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
+
+def parse_since(since: str, version: int) -> Optional[dict]:
+    """
+    Args:
+        since: The client's cursor, either a data version or an ISO timestamp
+        version: The data version being served; later entries belong to runs
+            that haven't published yet and are left for the next poll
+
+    Returns:
+        dict: The change log filter for the cursor, or None if it is neither
+    """
+    if since.isdigit():
+        return {'_id': {'$gt': int(since), '$lte': version}}
+    try:
+        time = datetime.fromisoformat(since)
+    except ValueError:
+        return None
+    # Stored times are naive UTC
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc).replace(tzinfo=None)
+    return {'_id': {'$lte': version}, 'time': {'$gt': time}}
+
+def change_log_expired(since: str, query: dict, oldest: Optional[dict]) -> bool:
+    """
+    Args:
+        since: The client's cursor
+        query: The filter parse_since made of it
+        oldest: The oldest change log entry, if any
+
+    Returns:
+        bool: Whether entries after the cursor may have expired, in which
+        case the client has to resync
+    """
+    if since.isdigit():
+        return oldest is not None and int(since) < oldest['_id'] - 1
+    return query['time']['$gt'] < datetime.now() - CHANGE_LOG_RETENTION
+
+def merge_change_log(entries: List[dict]) -> ChangeSet:
+    """
+    Folds change log entries, oldest first, into one set of ids. A topic
+    that was updated and later merged away is only reported as removed.
+    """
+    stories, topics, removed = {}, {}, {}
+    summary = False
+    for entry in entries:
+        for story_id in entry.get('stories', []):
+            stories[story_id] = True
+        for topic_id in entry.get('topics', []):
+            topics[topic_id] = True
+            removed.pop(topic_id, None)
+        for t in entry.get('removed_topics', []):
+            removed[t['_id']] = t['merged_into']
+            topics.pop(t['_id'], None)
+        summary = summary or entry.get('summary', False)
+    return ChangeSet(list(stories), list(topics), removed, summary)
+
+def changes_json(cursor: int, has_more: bool, changes: ChangeSet, stories: List[dict], topics: List[dict],
+                 articles_by_topic: dict, summary: Optional[dict]) -> dict:
+    """
+    Args:
+        stories, topics: The current documents of changes.stories and of
+            the changes.topics that still exist
+        summary: The latest daily summary if it changed
+    """
+    return {
+        'cursor': cursor,
+        'has_more': has_more,
+        'resync': False,
+        'stories': [story_json(s) for s in stories],
+        'topics': [topic_json(t, articles_by_topic[t['_id']]) for t in topics],
+        'removed_topics': [{'id': str(t), 'merged_into': str(m)} for t, m in changes.removed_topics.items()],
+        'summary': summary_json(summary) if summary else None,
+    }
@@ -0,0 +1,106 @@
+import os
+import gzip
+import json
+import hashlib
+import mimetypes
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Built assets go here, under the static folder, and are never modified
+DIST_DIR = 'dist'
+# Files crawlers expect at fixed URLs
+UNVERSIONED = {'robots.txt', 'ads.txt'}
+# Already-compressed formats gain nothing from gzip or brotli
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.txt', '.ico', '.json', '.xml', '.html'}
+# A year, the conventional maximum for immutable responses
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+class AssetManifest:
+    """
+    Maps static file names to content-hashed copies under static/dist, e.g.
+    styles.css -> dist/styles.3f2a9c1b7d4e.css. A hashed URL never changes
+    content, so it can be cached by clients forever. Compressible files also
+    get .gz and, with the brotli module installed, .br variants.
+    """
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+        self.dist_folder = os.path.join(static_folder, DIST_DIR)
+        self.files: Dict[str, str] = {}
+
+    def build(self) -> Dict[str, str]:
+        """
+        Writes the hashed copies and manifest.json for every static file.
+        Copies that already exist are left alone, so this is cheap to run on
+        every start.
+
+        Returns:
+            dict: Original name -> hashed name, relative to the static folder
+        """
+        os.makedirs(self.dist_folder, exist_ok=True)
+        files = {}
+        for root, dirs, names in os.walk(self.static_folder):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != self.dist_folder]
+            for name in names:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                if rel in UNVERSIONED:
+                    continue
+                with open(path, 'rb') as f:
+                    content = f.read()
+                digest = hashlib.sha256(content).hexdigest()[:12]
+                base, ext = os.path.splitext(rel)
+                hashed = f'{base}.{digest}{ext}'
+                self._write(hashed, content, ext.lower() in COMPRESSIBLE_EXTENSIONS)
+                files[rel] = f'{DIST_DIR}/{hashed}'
+
+        with open(os.path.join(self.dist_folder, 'manifest.json'), 'w') as f:
+            json.dump(files, f, indent=2, sort_keys=True)
+        self.files = files
+        return files
+
+    def _write(self, hashed: str, content: bytes, compressible: bool):
+        target = os.path.join(self.dist_folder, hashed)
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        variants = [('', content)]
+        if compressible:
+            variants.append(('.gz', gzip.compress(content, compresslevel=9, mtime=0)))
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(content, quality=11)))
+        # Variants first, so a request never sees the base file without them
+        for suffix, data in reversed(variants):
+            tmp = f'{target}{suffix}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, target + suffix)
+
+    def resolve(self, filename: str) -> str:
+        """
+        Returns:
+            str: The hashed name for filename, or filename itself if it isn't
+            a known asset
+        """
+        return self.files.get(filename, filename)
+
+    def variant(self, filename: str, accept_encodings) -> Tuple[str, Optional[str], Optional[str]]:
+        """
+        Picks the best precompressed variant of a dist file for the client.
+
+        Returns:
+            tuple: (file name to send, Content-Encoding or None, mimetype)
+        """
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in accept_encodings and os.path.exists(os.path.join(self.dist_folder, filename + suffix)):
+                return filename + suffix, encoding, mimetype
+        return filename, None, mimetype
+
+if __name__ == '__main__':
+    manifest = AssetManifest(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    for name, hashed in manifest.build().items():
+        print(f"{name} -> {hashed}")
@@ -0,0 +1,357 @@
+"""
+Optional asyncio variant of the app, for serving under an ASGI server:
+
+    cd web && hypercorn async_app:app --bind 0.0.0.0:5001 --workers 4
+
+It serves the same routes as flask_app, from the same queries, view models
+and templates (pages.py, api.py), behind the same request guards, page cache
+and response finalization. The difference is that it talks to Mongo through
+pymongo's AsyncMongoClient, so independent queries of a page run concurrently.
+"""
+import os
+import asyncio
+from datetime import datetime
+from pymongo import AsyncMongoClient
+from quart import Quart, Response, render_template, request, abort, redirect, url_for, send_from_directory
+from guards import RequestGuards
+from assets import AssetManifest, ASSET_MAX_AGE
+from db import get_mongo_client
+from data_version import DataVersion
+from page_cache import PageCache, backend_from_env
+from template_cache import FragmentCache, bytecode_cache_from_env
+from search import StorySearch
+from api import (
+    SUMMARY_PROJECTION, MAX_CHANGE_ENTRIES,
+    json_response, story_page_json, topic_json, summary_json,
+    parse_since, change_log_expired, merge_change_log, changes_json
+)
+from http_cache import finalize_async_response, set_cache_control
+from pagination import Page, PAGE_SIZE, page_query, build_page
+from pages import (
+    FEEDS_DIR, feed_mimetype, topic_feed_exists, parse_id, get_sort, get_page_args,
+    story_list_source, live_topics_query, keyword_query, wants_snapshot, snapshot_page,
+    topic_articles_query, group_topic_articles, story_list_context, story_page_context,
+    topics_page_context, search_args, search_page
+)
+from view_models import (
+    TopicCard,
+    STORY_CARD_PROJECTION,
+    TOPIC_CARD_PROJECTION,
+    STORY_PAGE_PROJECTION,
+    SIMILAR_STORY_PROJECTION
+)
+
+app = Quart(__name__)
+
+# Bot and IP blocking and per-client request budgets (see guards.py)
+guards = RequestGuards.from_env()
+
+# Static files are served from content-hashed copies (see assets.py)
+assets = AssetManifest(app.static_folder)
+assets.build()
+
+fragment_cache = FragmentCache()
+fragment_cache.install(app.jinja_env)
+app.jinja_env.bytecode_cache = bytecode_cache_from_env('async_app')
+
+def load_data_version():
+    # A single small read every few seconds; it goes through the synchronous
+    # client, in a thread (see refresh_data_version)
+    return get_mongo_client()["nb3000"]["meta"].find_one({"_id": "data_version"})
+
+# Rendered pages are cached until the ingest bumps the data version
+data_version = DataVersion(load_data_version)
+page_cache = PageCache(backend_from_env(), data_version)
+
+mongo_client = None
+
+@app.before_serving
+async def open_mongo_client():
+    # Runs once in each worker, on that worker's event loop
+    global mongo_client
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        raise ValueError("MONGO_URI environment variable must be set")
+    mongo_client = AsyncMongoClient(
+        uri,
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        connectTimeoutMS=5000,
+        serverSelectionTimeoutMS=5000,
+        socketTimeoutMS=10000
+    )
+
+@app.after_serving
+async def close_mongo_client():
+    if mongo_client is not None:
+        await mongo_client.close()
+
+def get_db():
+    return mongo_client["nb3000"]
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    # url_for('static', filename='styles.css') -> /static/dist/styles.<hash>.css
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = assets.resolve(values['filename'])
+
+@app.route('/static/dist/<path:filename>')
+async def serve_asset(filename):
+    path, encoding, mimetype = assets.variant(filename, request.accept_encodings)
+    response = await send_from_directory(assets.dist_folder, path, mimetype=mimetype, cache_timeout=ASSET_MAX_AGE)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.context_processor
+async def inject_current_year():
+    return {'current_year': datetime.utcnow().year}
+
+@app.route('/robots.txt')
+async def serve_robots():
+    return await send_from_directory('static', 'robots.txt')
+
+@app.route('/ads.txt')
+async def serve_ads():
+    return await send_from_directory('static', 'ads.txt')
+
+@app.route('/feeds/<path:name>')
+async def serve_feed(name):
+    mimetype = feed_mimetype(name)
+    if mimetype is None:
+        abort(404)
+    return await send_from_directory(FEEDS_DIR, name, mimetype=mimetype, cache_timeout=600)
+
+@app.route('/healthz')
+async def health_check():
+    try:
+        await mongo_client.admin.command('ping')
+    except Exception as e:
+        print(f"Mongo health check failed: {e}")
+        return "unavailable", 503
+    return "ok"
+
+@app.before_request
+async def check_request():
+    return guards.check(request)
+
+@app.before_request
+async def refresh_data_version():
+    # Keep the blocking lookup off the event loop
+    if data_version.expired():
+        await asyncio.to_thread(data_version.refresh)
+
+@app.after_request
+async def add_header(response):
+    set_cache_control(response, request)
+    return await finalize_async_response(response, request, data_version)
+
+async def paginate(collection, query, projection, sort, after=None, before=None, limit=PAGE_SIZE):
+    q = page_query(query, sort, after, before, limit)
+    return build_page(q, await collection.find(q.query, projection).sort(q.sort).limit(q.limit).to_list())
+
+async def load_feed_snapshot(mongo_db, feed_id, sort):
+    if feed_id is None or not wants_snapshot(request.args):
+        return None, None
+    feed = await mongo_db["feeds"].find_one({"_id": feed_id})
+    page = snapshot_page(feed, sort)
+    return (page, feed) if page is not None else (None, None)
+
+async def load_story_list(mongo_db, category, sort):
+    feed_id, query = story_list_source(category, sort)
+    page, _ = await load_feed_snapshot(mongo_db, feed_id, sort)
+    if page is None:
+        page = await paginate(mongo_db["stories"], query, STORY_CARD_PROJECTION, sort, *get_page_args(request.args))
+    return page
+
+async def load_topic_articles(stories_collection, topics):
+    query, topics_by_article = topic_articles_query(topics)
+    articles = []
+    if query is not None:
+        articles = await stories_collection.find(query, STORY_CARD_PROJECTION).sort('updated', -1).to_list()
+    return group_topic_articles(topics, topics_by_article, articles)
+
+async def load_live_topics(mongo_db):
+    page = await paginate(mongo_db["topics"], live_topics_query(), TOPIC_CARD_PROJECTION, 'time',
+                          *get_page_args(request.args))
+    topics = [topic for topic in page.items if topic.get('stories')]
+    return page, topics, await load_topic_articles(mongo_db["stories"], topics)
+
+async def render_story_list(page, sort, location, **kwargs):
+    return await render_template("news.html", **story_list_context(page, sort, location, **kwargs))
+
+@app.route('/stories')
+@page_cache.cached_async
+async def display_news():
+    sort = get_sort(request.args)
+    page = await load_story_list(get_db(), None, sort)
+    return await render_story_list(page, sort, "stories", feed_url=url_for('serve_feed', name='stories.atom'))
+
+@app.route('/story/<story_id>')
+@page_cache.cached_async
+async def display_story(story_id):
+    stories_collection = get_db()["stories"]
+    story_id = parse_id(story_id)
+    story = await stories_collection.find_one({"_id": story_id}, STORY_PAGE_PROJECTION) if story_id else None
+    if story is None:
+        abort(404)
+
+    similar_ids = [s['_id'] for s in story.get('similar_stories', [])]
+    similar_stories = []
+    if similar_ids:
+        similar_stories = await stories_collection.find(
+            {'_id': {'$in': similar_ids}}, SIMILAR_STORY_PROJECTION
+        ).sort('updated', -1).to_list()
+
+    return await render_template("story.html", **story_page_context(story, similar_stories))
+
+@app.route('/category/<category>', defaults={'subcategory': None})
+@app.route('/category/<category>/<subcategory>')
+@page_cache.cached_async
+async def display_category(category, subcategory):
+    sort = get_sort(request.args)
+    cat = category + '/' + subcategory if subcategory else category
+    page = await load_story_list(get_db(), cat, sort)
+    return await render_story_list(page, sort, "category/" + cat, feed_url=url_for('serve_feed', name=f'category/{cat}.atom'))
+
+@app.route('/keyword/<keyword>')
+@page_cache.cached_async
+async def display_keyword(keyword):
+    sort = get_sort(request.args)
+    mongo_db = get_db()
+    k = await mongo_db["keywords"].find_one({"keyword": keyword}, {"similar_keywords": 1})
+    if k is None:
+        return await render_story_list(Page([], None, None), sort, "keyword/" + keyword,
+                                       error_message=f"Keyword '{keyword}' not found.")
+
+    page = await paginate(mongo_db["stories"], keyword_query(keyword, k), STORY_CARD_PROJECTION, sort,
+                          *get_page_args(request.args))
+    return await render_story_list(page, sort, "keyword/" + keyword)
+
+story_search = StorySearch()
+
+@app.route('/search')
+async def search_stories():
+    query, sort, offset, limit = search_args(request.args)
+    # SQLite is synchronous; keep it off the event loop
+    results = await asyncio.to_thread(story_search.search, query, sort, offset, limit)
+    stories = []
+    if results.ids:
+        stories = await get_db()["stories"].find({'_id': {'$in': results.ids}}, STORY_CARD_PROJECTION).to_list()
+    return await render_story_list(search_page(results, stories, offset, limit), sort, "search", query=query)
+
+@app.route('/')
+@page_cache.cached_async
+async def display_topics():
+    mongo_db = get_db()
+    page, feed = await load_feed_snapshot(mongo_db, "main", 'time')
+    if page is not None:
+        latest_daily_summary = feed.get('latest_daily_summary')
+        topics = page.items
+        articles_by_topic = {topic['_id']: topic['articles'] for topic in topics}
+    else:
+        # The daily summary and the topic page don't depend on each other
+        latest_daily_summary, (page, topics, articles_by_topic) = await asyncio.gather(
+            mongo_db["news_summaries"].find_one(sort=[('date', -1)]),
+            load_live_topics(mongo_db)
+        )
+
+    return await render_template("topics.html", **topics_page_context(page, topics, articles_by_topic, latest_daily_summary))
+
+@app.route('/topic/<topic_id>')
+@page_cache.cached_async
+async def display_topic_detail(topic_id):
+    mongo_db = get_db()
+    oid = parse_id(topic_id)
+    if oid is None:
+        return "Topic not found or invalid ID", 404
+    topic = await mongo_db["topics"].find_one({"_id": oid}, TOPIC_CARD_PROJECTION)
+    if not topic:
+        return "Topic not found", 404
+    if topic.get('merged_into'):
+        return redirect(url_for('display_topic_detail', topic_id=str(topic['merged_into'])), 301)
+
+    articles_by_topic = await load_topic_articles(mongo_db["stories"], [topic])
+    return await render_template("topic_detail.html",
+                                 topic=TopicCard.from_doc(topic, articles_by_topic[topic['_id']]),
+                                 location="topic_detail",
+                                 feed_url=url_for('serve_feed', name=f'topic/{topic_id}.atom') if topic_feed_exists(topic_id) else None)
+
+# JSON API, as in flask_app
+
+@app.route('/api/v1/stories')
+@page_cache.cached_async
+async def api_stories():
+    sort = get_sort(request.args)
+    page = await load_story_list(get_db(), request.args.get('category'), sort)
+    return json_response(story_page_json(page), response_class=Response)
+
+@app.route('/api/v1/topics/<topic_id>')
+@page_cache.cached_async
+async def api_topic(topic_id):
+    mongo_db = get_db()
+    oid = parse_id(topic_id)
+    topic = await mongo_db["topics"].find_one({"_id": oid}, TOPIC_CARD_PROJECTION) if oid else None
+    if not topic:
+        return json_response({'error': 'Topic not found'}, 404, response_class=Response)
+    if topic.get('merged_into'):
+        return redirect(url_for('api_topic', topic_id=str(topic['merged_into'])), 301)
+
+    articles = (await load_topic_articles(mongo_db["stories"], [topic]))[topic['_id']]
+    return json_response(topic_json(topic, articles), response_class=Response)
+
+@app.route('/api/v1/summary/latest')
+@page_cache.cached_async
+async def api_latest_summary():
+    summary = await get_db()["news_summaries"].find_one({}, SUMMARY_PROJECTION, sort=[('date', -1)])
+    if summary is None:
+        return json_response({'error': 'No summary yet'}, 404, response_class=Response)
+    return json_response(summary_json(summary), response_class=Response)
+
+@app.route('/api/v1/changes')
+async def api_changes():
+    # Not page cached; see flask_app.api_changes
+    mongo_db = get_db()
+    changes_col = mongo_db["changes"]
+    # Entries only up to the version being served; see flask_app.api_changes
+    latest_version = data_version.version
+
+    since = request.args.get('since', '')
+    if not since:
+        return json_response({'cursor': latest_version}, response_class=Response)
+    query = parse_since(since, latest_version)
+    if query is None:
+        return json_response({'error': 'since must be a data version or an ISO timestamp'}, 400, response_class=Response)
+
+    oldest = await changes_col.find_one({}, {'time': 1}, sort=[('_id', 1)])
+    if change_log_expired(since, query, oldest):
+        return json_response({'cursor': latest_version, 'resync': True}, response_class=Response)
+
+    entries = await changes_col.find(query).sort('_id', 1).limit(MAX_CHANGE_ENTRIES + 1).to_list()
+    has_more = len(entries) > MAX_CHANGE_ENTRIES
+    entries = entries[:MAX_CHANGE_ENTRIES]
+    cursor = entries[-1]['_id'] if entries else (int(since) if since.isdigit() else latest_version)
+    changes = merge_change_log(entries)
+
+    async def find_stories():
+        if not changes.stories:
+            return []
+        return await mongo_db["stories"].find({'_id': {'$in': changes.stories}}, STORY_CARD_PROJECTION).to_list()
+
+    async def find_topics():
+        if not changes.topics:
+            return [], {}
+        topics = await mongo_db["topics"].find({'_id': {'$in': changes.topics}, 'merged_into': {'$exists': False}},
+                                               TOPIC_CARD_PROJECTION).to_list()
+        return topics, await load_topic_articles(mongo_db["stories"], topics)
+
+    async def find_summary():
+        if not changes.summary:
+            return None
+        return await mongo_db["news_summaries"].find_one({}, SUMMARY_PROJECTION, sort=[('date', -1)])
+
+    stories, (topics, articles_by_topic), summary = await asyncio.gather(find_stories(), find_topics(), find_summary())
+    return json_response(changes_json(cursor, has_more, changes, stories, topics, articles_by_topic, summary),
+                         response_class=Response)
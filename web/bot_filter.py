@@ -0,0 +1,91 @@
+import os
+import re
+import random
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger('nb3000.bots')
+
+DEFAULT_BOT_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bots.txt')
+
+def load_signatures(paths: Iterable[str]) -> List[str]:
+    """
+    Reads User-Agent signatures from list files, one per line. Blank lines
+    and lines starting with '#' are ignored.
+    """
+    signatures = []
+    for path in paths:
+        try:
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        signatures.append(line)
+        except OSError as e:
+            logger.warning("Could not read bot list %s: %s", path, e)
+    return signatures
+
+class BotFilter:
+    """
+    Matches User-Agent strings case-insensitively against all bot
+    signatures with a single compiled regex, and counts blocks per signature.
+    Blocks are logged for a sample of requests only, plus the first block
+    of each signature.
+    """
+    def __init__(self, signatures: Iterable[str], log_sample_rate: float = 0.01):
+        # Canonical spelling of each signature by its lowercase form
+        self.signatures: Dict[str, str] = {}
+        for s in signatures:
+            self.signatures.setdefault(s.lower(), s)
+        # Longest first, so a signature that contains another one wins
+        alternatives = sorted(self.signatures, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(s) for s in alternatives)) if alternatives else None
+        self.log_sample_rate = log_sample_rate
+        self.blocked: Counter = Counter()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'BotFilter':
+        """
+        Builds the filter from bots.txt plus any files in BOT_LIST_FILES,
+        logging a BOT_LOG_SAMPLE_RATE fraction of blocks.
+        """
+        paths = [DEFAULT_BOT_LIST] + [p for p in os.getenv('BOT_LIST_FILES', '').split(os.pathsep) if p]
+        return cls(load_signatures(paths), float(os.getenv('BOT_LOG_SAMPLE_RATE', '0.01')))
+
+    def match(self, user_agent: str) -> Optional[str]:
+        """
+        Returns:
+            str: The signature found in user_agent, or None
+        """
+        if self.pattern is None or not user_agent:
+            return None
+        # Lowercasing once is cheaper than a case-insensitive search
+        m = self.pattern.search(user_agent.lower())
+        return self.signatures[m.group(0)] if m else None
+
+    def record_block(self, signature: str, user_agent: str, path: str):
+        with self.lock:
+            self.blocked[signature] += 1
+            count = self.blocked[signature]
+        if count == 1 or random.random() < self.log_sample_rate:
+            logger.info("bot_blocked signature=%s count=%d path=%s user_agent=%r", signature, count, path, user_agent)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.blocked)
+
+if __name__ == '__main__':
+    # Measure the per-request cost of filtering
+    import timeit
+    bot_filter = BotFilter.from_env()
+    agents = [
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+        'Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)',
+    ]
+    for ua in agents:
+        n = 100000
+        seconds = timeit.timeit(lambda: bot_filter.match(ua), number=n)
+        print(f"{seconds / n * 1e6:.2f} us per match ({bot_filter.match(ua)}): {ua}")
@@ -0,0 +1,43 @@
+import time
+import threading
+from datetime import datetime
+from typing import Callable, Optional
+
+class DataVersion:
+    """
+    Process-local view of the data version the ingest bumps at the end of
+    each cron run. The version document is re-read at most once per ttl
+    seconds, so most requests never touch the database for it.
+    """
+    def __init__(self, load: Callable[[], Optional[dict]], ttl: float = 30):
+        self.load = load
+        self.ttl = ttl
+        self.version = 0
+        self.run_start_time: Optional[datetime] = None
+        self.checked = 0.0
+        self.lock = threading.Lock()
+
+    def current(self) -> int:
+        """
+        Returns:
+            int: The current data version, 0 if the ingest has never set one
+        """
+        if self.expired():
+            self.refresh()
+        return self.version
+
+    def expired(self) -> bool:
+        return time.monotonic() - self.checked >= self.ttl
+
+    def refresh(self):
+        with self.lock:
+            if not self.expired():
+                return
+            try:
+                doc = self.load() or {}
+                self.version = doc.get('version', 0)
+                self.run_start_time = doc.get('run_start_time')
+            except Exception as e:
+                # Keep serving the last known version if the lookup fails
+                print(f"Error loading data version: {e}")
+            self.checked = time.monotonic()
@@ -0,0 +1,57 @@
+import os
+import threading
+from typing import Optional
+from pymongo import MongoClient
+
+_client: Optional[MongoClient] = None
+_client_pid: Optional[int] = None
+_lock = threading.Lock()
+
+def get_mongo_client() -> MongoClient:
+    """
+    Returns the worker process's MongoClient, creating it on first use.
+
+    The client owns a connection pool and is shared by all requests in the
+    process. It is created lazily and re-created if the process id changes,
+    so a pre-forking server that imports the app before forking still gets
+    one client per worker rather than sharing sockets across processes.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _lock:
+            if _client is None or _client_pid != os.getpid():
+                uri = os.getenv("MONGO_URI")
+                if not uri:
+                    raise ValueError("MONGO_URI environment variable must be set")
+                _client = MongoClient(
+                    uri,
+                    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+                    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "2")),
+                    maxIdleTimeMS=60000,
+                    connectTimeoutMS=5000,
+                    serverSelectionTimeoutMS=5000,
+                    socketTimeoutMS=10000,
+                    connect=False
+                )
+                _client_pid = os.getpid()
+    return _client
+
+def reset_mongo_client():
+    """
+    Drops this process's client. Call from a server's post-fork hook if the
+    parent process may have used the database.
+    """
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def ping_mongo() -> bool:
+    try:
+        get_mongo_client().admin.command('ping')
+        return True
+    except Exception as e:
+        print(f"Mongo health check failed: {e}")
+        return False
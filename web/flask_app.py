@@ -1,22 +1,62 @@
-from flask import Flask, render_template, request, g, send_from_directory, abort
-from pymongo import MongoClient
-from bson import ObjectId
-from datetime import datetime, timedelta
+from flask import Flask, render_template, request, send_from_directory, abort, redirect, url_for
+from datetime import datetime
 import os
-import dateparser
-from ip_blocker import IPBlocker
+import logging
+from guards import RequestGuards
+from assets import AssetManifest, ASSET_MAX_AGE
+from db import get_mongo_client, ping_mongo, reset_mongo_client
+from data_version import DataVersion
+from page_cache import PageCache, backend_from_env
+from template_cache import FragmentCache, bytecode_cache_from_env
+from search import StorySearch
+from api import (
+    SUMMARY_PROJECTION, MAX_CHANGE_ENTRIES,
+    json_response, story_page_json, topic_json, summary_json,
+    parse_since, change_log_expired, merge_change_log, changes_json
+)
+from http_cache import finalize_response, set_cache_control
+from pagination import Page, paginate
+from pages import (
+    FEEDS_DIR, feed_mimetype, topic_feed_exists, parse_id, get_sort, get_page_args,
+    story_list_source, live_topics_query, keyword_query, wants_snapshot, snapshot_page,
+    topic_articles_query, group_topic_articles, story_list_context, story_page_context,
+    topics_page_context, search_args, search_page
+)
+from view_models import (
+    TopicCard,
+    STORY_CARD_PROJECTION,
+    TOPIC_CARD_PROJECTION,
+    STORY_PAGE_PROJECTION,
+    SIMILAR_STORY_PROJECTION
+)
 
 app = Flask(__name__)
 
-# Initialize IP blocker
-ip_blocker = IPBlocker()
-
-bots = [
-    'SemrushBot',
-    'AhrefsBot',
-    'Bingbot',
-    'YandexBot',
-]
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s %(message)s')
+
+# Bot and IP blocking and per-client request budgets (see guards.py)
+guards = RequestGuards.from_env()
+
+# Static files are served from content-hashed copies (see assets.py)
+assets = AssetManifest(app.static_folder)
+assets.build()
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    # url_for('static', filename='styles.css') -> /static/dist/styles.<hash>.css
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = assets.resolve(values['filename'])
+
+@app.route('/static/dist/<path:filename>')
+def serve_asset(filename):
+    path, encoding, mimetype = assets.variant(filename, request.accept_encodings)
+    response = send_from_directory(assets.dist_folder, path, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @app.context_processor
 def inject_current_year():
@@ -30,440 +70,301 @@ def serve_robots():
 def serve_ads():
     return send_from_directory('static', 'ads.txt')
 
-
-def get_mongo_client():
-    if 'mongo_client' not in g:
-        uri = os.getenv("MONGO_URI")
-        if not uri:
-            raise ValueError("MONGO_URI environment variable must be set")
-        g.mongo_client = MongoClient(uri)
-    return g.mongo_client
+@app.route('/feeds/<path:name>')
+def serve_feed(name):
+    mimetype = feed_mimetype(name)
+    if mimetype is None:
+        abort(404)
+    # Files are only rewritten when their content changes, so the ETag and
+    # Last-Modified derived from the file stay valid between runs
+    return send_from_directory(FEEDS_DIR, name, mimetype=mimetype, max_age=600)
+
+@app.route('/healthz')
+def health_check():
+    if not ping_mongo():
+        return "unavailable", 503
+    return "ok"
+
+def load_data_version():
+    return get_mongo_client()["nb3000"]["meta"].find_one({"_id": "data_version"})
+
+# Rendered pages are cached until the ingest bumps the data version
+data_version = DataVersion(load_data_version)
+page_cache = PageCache(backend_from_env(), data_version)
+
+# Cards are cached per story/topic across data versions, since most of them
+# don't change from one ingest run to the next
+fragment_cache = FragmentCache()
+fragment_cache.install(app.jinja_env)
+app.jinja_env.bytecode_cache = bytecode_cache_from_env('flask_app')
 
 @app.before_request
-def block_bots():
-    # Get user agent and convert to lowercase for case-insensitive matching
-    user_agent = request.headers.get('User-Agent', '').lower()
-    print(f"DEBUG: Received request with User-Agent: {user_agent}")
-    
-    # Check if user agent contains any known bot identifiers
-    for bot in bots:
-        if bot.lower() in user_agent:
-            print(f"DEBUG: Blocking bot: {bot} found in {user_agent}")
-            abort(403)  # Forbidden
-    
-    # # Check all IPs in X-Forwarded-For, or remote_addr if not present
-    # forwarded_for = request.headers.get('X-Forwarded-For')
-    # if forwarded_for:
-    #     ip_list = [ip.strip() for ip in forwarded_for.split(',')]
-    # else:
-    #     ip_list = [request.remote_addr]
-    # for ip in ip_list:
-    #     print(f"DEBUG: Checking IP: {ip}")
-    #     if ip_blocker.is_blocked(ip):
-    #         print(f"DEBUG: Blocking IP: {ip}")
-    #         abort(403)  # Forbidden
-    # print(f"DEBUG: None of the IPs {ip_list} are blocked")
+def check_request():
+    return guards.check(request)
 
 @app.after_request
 def add_header(response):
-    response.cache_control.max_age = 600
-    return response
+    set_cache_control(response, request)
+    return finalize_response(response, request, data_version)
+
+def load_feed_snapshot(mongo_db, feed_id, sort):
+    """
+    Load the first page of a feed precomputed by the ingest (cron/feeds.py).
+
+    Returns:
+        tuple: (Page, feed document), or (None, None) if the request is for
+        another page or the snapshot is missing or too old to trust
+    """
+    if feed_id is None or not wants_snapshot(request.args):
+        return None, None
+    feed = mongo_db["feeds"].find_one({"_id": feed_id})
+    page = snapshot_page(feed, sort)
+    return (page, feed) if page is not None else (None, None)
+
+def load_story_list(mongo_db, category, sort):
+    """
+    Returns:
+        Page: The requested page of /stories, or of a category if one is given
+    """
+    feed_id, query = story_list_source(category, sort)
+    page, _ = load_feed_snapshot(mongo_db, feed_id, sort)
+    if page is None:
+        page = paginate(mongo_db["stories"], query, STORY_CARD_PROJECTION, sort, *get_page_args(request.args))
+    return page
+
+def load_topic_articles(stories_collection, topics):
+    """
+    Fetch the articles of all the given topics with a single $in query.
+
+    Returns:
+        dict: Topic _id -> list of its articles, most recently updated first
+    """
+    query, topics_by_article = topic_articles_query(topics)
+    articles = []
+    if query is not None:
+        # Sort articles within a topic by their update time
+        articles = stories_collection.find(query, STORY_CARD_PROJECTION).sort('updated', -1)
+    return group_topic_articles(topics, topics_by_article, articles)
+
+def render_story_list(page, sort, location, **kwargs):
+    return render_template("news.html", **story_list_context(page, sort, location, **kwargs))
 
 @app.route('/stories')
+@page_cache.cached
 def display_news():
-    sort = request.args.get('sort')
-    if not sort:
-        sort = 'time'
-    if sort != 'time' and sort != 'importance':
-        sort = 'time'
-    mongo_db = get_mongo_client()["nb3000"]
-    stories_collection = mongo_db["stories"]
-
-    # Fetch and sort stories by importance in descending order
-    horizon = datetime.now() - timedelta(days=1)
-    cursor = stories_collection.find({ "updated": {"$gt": horizon } })
-    if sort == 'time':
-        cursor = cursor.sort('updated', -1)
-    elif sort == 'importance':
-        cursor = cursor.sort([
-            ('summary.importance', -1),
-            ('updated', -1)  # Secondary sort by time descending
-        ])
-    stories = list(cursor)
-
-    # Handle case where there might be no stories after filtering
-    if not stories:
-        last_update_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_stories = []
-    else:
-        last_update_time = max(stories, key=lambda story: story['run_start_time'])['run_start_time']
-        last_update_time_str = last_update_time.strftime("%Y-%m-%d %H:%M:%S")
-        # Format stories for rendering
-        formatted_stories = [
-            {
-                "_id": story.get("_id"),
-                "headline": story.get("headline"),
-                "alt_headline": story.get("summary", {}).get("title"),
-                "updated": story.get("updated").strftime("%Y-%m-%d %H:%M UTC"),
-                "link": story.get("link"),
-                "summary": story.get("summary", {}).get("summary"),
-                "importance": "\U0001F525" * story.get("summary", {}).get("importance", 0),
-                "keywords": story.get("summary", {}).get("keywords"),
-                "category": story.get("summary", {}).get("category"),
-                "source": story.get("source"),
-                "request": request
-            }
-            for story in stories
-        ]
-
-    return render_template("news.html",
-        stories=formatted_stories,
-        sort_by=sort,
-        location="stories",
-        update_time=last_update_time_str)
+    sort = get_sort(request.args)
+    page = load_story_list(get_mongo_client()["nb3000"], None, sort)
+    return render_story_list(page, sort, "stories", feed_url=url_for('serve_feed', name='stories.atom'))
 
 @app.route('/story/<story_id>')
+@page_cache.cached
 def display_story(story_id):
     mongo_db = get_mongo_client()["nb3000"]
     stories_collection = mongo_db["stories"]
-    story = stories_collection.find_one({"_id": ObjectId(story_id)})
-    
-    pipeline = [
-        {
-            '$vectorSearch': {
-                'index': 'story_embed',
-                'path': 'embedding',
-                'queryVector': story['embedding'],
-                'numCandidates': 100,
-                'limit': 10
-            }
-        },
-        {
-            '$project': {
-                '_id': 1,
-                'summary': 1,
-                'source': 1,
-                'updated': 1,
-                'score': {
-                    '$meta': 'vectorSearchScore'
-                }
-            }
-        },
-        {
-            '$match': {
-                'score': { '$gte': 0.9 }
-            }
-        },
-        {
-            '$sort': {
-                'updated': -1
-            }
-        }
-    ]
-    similar_stories = list(stories_collection.aggregate(pipeline))
-    
-    similar_stories = [s for s in similar_stories if s['_id'] != story['_id']]
-    
-    for s in similar_stories:
-        s['updated'] = s['updated'].strftime("%Y-%m-%d %H:%M UTC")
-
-    return render_template("story.html", 
-                           story=story, 
-                           similar_stories=similar_stories,
-                           importance="\U0001F525" * story.get("summary", {}).get("importance", 0))
+    story_id = parse_id(story_id)
+    story = stories_collection.find_one({"_id": story_id}, STORY_PAGE_PROJECTION) if story_id else None
+    if story is None:
+        abort(404)
+
+    # Similar stories (score >= 0.9) are linked by the ingest
+    similar_ids = [s['_id'] for s in story.get('similar_stories', [])]
+    similar_stories = []
+    if similar_ids:
+        similar_stories = list(stories_collection.find(
+            {'_id': {'$in': similar_ids}},
+            SIMILAR_STORY_PROJECTION
+        ).sort('updated', -1))
+
+    return render_template("story.html", **story_page_context(story, similar_stories))
 
 @app.route('/category/<category>', defaults={'subcategory': None})
 @app.route('/category/<category>/<subcategory>')
+@page_cache.cached
 def display_category(category, subcategory):
-    sort = request.args.get('sort')
-    if not sort:
-        sort = 'time'
-    if sort != 'time' and sort != 'importance':
-        sort = 'time'
-    horizon = datetime.now() - timedelta(days=14)
-    mongo_db = get_mongo_client()["nb3000"]
-    stories_collection = mongo_db["stories"]
+    sort = get_sort(request.args)
     cat = category + '/' + subcategory if subcategory else category
-    cursor = stories_collection.find({ 'updated': {'$gt': horizon }, 'summary.categories': cat })
-    if sort == 'time':
-        cursor = cursor.sort('updated', -1)
-    elif sort == 'importance':
-        cursor = cursor.sort([
-            ('summary.importance', -1),
-            ('updated', -1)  # Secondary sort by time descending
-        ])
-    cursor = cursor.allow_disk_use(True)
-    stories = list(cursor)
-
-    if not stories:
-        last_update_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_stories = []
-    else:
-        last_update_time = max(stories, key=lambda story: story['run_start_time'])['run_start_time']
-        last_update_time_str = last_update_time.strftime("%Y-%m-%d %H:%M:%S")
-        formatted_stories = [
-            {
-                "_id": story.get("_id"),
-                "headline": story.get("headline"),
-                "alt_headline": story.get("summary", {}).get("title"),
-                "updated": story.get("updated").strftime("%Y-%m-%d %H:%M UTC"),
-                "link": story.get("link"),
-                "summary": story.get("summary", {}).get("summary"),
-                "importance": "\U0001F525" * story.get("summary", {}).get("importance", 0),
-                "keywords": story.get("summary", {}).get("keywords"),
-                "category": story.get("summary", {}).get("category"),
-                "source": story.get("source"),
-                "request": request
-            }
-            for story in stories
-        ]
-
-    return render_template("news.html",
-        stories=formatted_stories,
-        sort_by=sort,
-        location="category/" + cat,
-        update_time=last_update_time_str)
+    page = load_story_list(get_mongo_client()["nb3000"], cat, sort)
+    return render_story_list(page, sort, "category/" + cat, feed_url=url_for('serve_feed', name=f'category/{cat}.atom'))
 
 @app.route('/keyword/<keyword>')
+@page_cache.cached
 def display_keyword(keyword):
-    sort = request.args.get('sort')
-    if not sort:
-        sort = 'time'
-    if sort != 'time' and sort != 'importance':
-        sort = 'time'
+    sort = get_sort(request.args)
     mongo_db = get_mongo_client()["nb3000"]
     keywords_col = mongo_db["keywords"]
     stories_col = mongo_db['stories']
-    k = keywords_col.find_one({"keyword": keyword})
+    k = keywords_col.find_one({"keyword": keyword}, {"similar_keywords": 1})
     
     # Check if the keyword was found
     if k is None:
         # Keyword not found, return empty results or a specific message
-        # For now, let's return an empty list of stories and a current time update
-        return render_template("news.html",
-                               stories=[],
-                               sort_by=sort,
-                               location="keyword/" + keyword,
-                               update_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                               error_message=f"Keyword '{keyword}' not found.")
+        return render_story_list(Page([], None, None), sort, "keyword/" + keyword,
+                                 error_message=f"Keyword '{keyword}' not found.")
     
-    emb = k["embedding"]
-
-    pipeline = [
-        {
-            '$vectorSearch': {
-                'index': 'embed_search',
-                'path': 'embedding',
-                'queryVector': emb,
-                'numCandidates': 100,
-                'limit': 10
-            }
-        },
-        {
-            '$project': {
-                '_id': 0,
-                'keyword': 1,
-                'score': {
-                    '$meta': 'vectorSearchScore'
-                }
-            }
-        },
-        {
-            '$match': {
-                'score': { '$gte': 0.9 }
-            }
-        }
-    ]
-    results = list(keywords_col.aggregate(pipeline))
-    keywords = [k["keyword"] for k in results]
-
-    cursor = stories_col.find({'summary.keywords': {"$in": keywords}})
-    if sort == 'time':
-        cursor = cursor.sort('updated', -1)
-    elif sort == 'importance':
-        cursor = cursor.sort([
-            ('summary.importance', -1),
-            ('updated', -1)  # Secondary sort by time descending
-        ])
-    cursor = cursor.allow_disk_use(True)
-    stories = list(cursor)
-
-    if not stories:
-        last_update_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_stories = []
-    else:
-        last_update_time = max(stories, key=lambda story: story['run_start_time'])['run_start_time']
-        last_update_time_str = last_update_time.strftime("%Y-%m-%d %H:%M:%S")
-        formatted_stories = [
-            {
-                "_id": story.get("_id"),
-                "headline": story.get("headline"),
-                "alt_headline": story.get("summary", {}).get("title"),
-                "updated": story.get("updated").strftime("%Y-%m-%d %H:%M UTC"),
-                "link": story.get("link"),
-                "summary": story.get("summary", {}).get("summary"),
-                "importance": "\U0001F525" * story.get("summary", {}).get("importance", 0),
-                "keywords": story.get("summary", {}).get("keywords"),
-                "category": story.get("summary", {}).get("category"),
-                "source": story.get("source"),
-                "request": request
-            }
-            for story in stories
-        ]
-
-    return render_template("news.html",
-        stories=formatted_stories,
-        sort_by=sort,
-        location="keyword/" + keyword,
-        update_time=last_update_time_str)
+    page = paginate(stories_col, keyword_query(keyword, k), STORY_CARD_PROJECTION, sort, *get_page_args(request.args))
+
+    return render_story_list(page, sort, "keyword/" + keyword)
+
+story_search = StorySearch()
+
+@app.route('/search')
+def search_stories():
+    query, sort, offset, limit = search_args(request.args)
+    results = story_search.search(query, sort, offset, limit)
+    stories = []
+    if results.ids:
+        stories_col = get_mongo_client()["nb3000"]["stories"]
+        stories = list(stories_col.find({'_id': {'$in': results.ids}}, STORY_CARD_PROJECTION))
+    return render_story_list(search_page(results, stories, offset, limit), sort, "search", query=query)
 
 @app.route('/') # Changed from /topics to /
+@page_cache.cached
 def display_topics():
     mongo_db = get_mongo_client()["nb3000"]
-    topics_collection = mongo_db["topics"]
-    stories_collection = mongo_db["stories"]
-    news_summaries_collection = mongo_db["news_summaries"] # Added news_summaries collection
-
-    # Fetch the latest daily news summary
-    latest_daily_summary = news_summaries_collection.find_one(sort=[('date', -1)])
 
-    # Define the time horizon for fetching topics (last 48 hours)
-    horizon = datetime.now() - timedelta(hours=48)
-
-    # Fetch topics sorted by last updated time, filtered by the horizon
-    topics_cursor = topics_collection.find(
-        {'updated': {'$gte': horizon}}
-    ).sort('updated', -1).allow_disk_use(True) # -1 for descending
-    
-    processed_topics = []
-    for topic in topics_cursor:
-        # For each topic, fetch its articles
-        article_ids = topic.get('stories', [])
-        if not article_ids: # Skip if a topic somehow has no story IDs
-            continue
-        
-        # Ensure article_ids are ObjectIds if they aren't already (they should be)
-        object_id_article_ids = [ObjectId(id_val) for id_val in article_ids]
-        
-        articles_cursor = stories_collection.find({
-            '_id': { '$in': object_id_article_ids }
-        }).sort('updated', -1) # Sort articles within a topic by their update time
-        
-        articles_in_topic = list(articles_cursor)
-        
-        # Format articles for display (similar to other routes)
-        formatted_articles = []
-        for article in articles_in_topic:
-            formatted_articles.append({
-                "_id": article.get("_id"),
-                "headline": article.get("headline"),
-                "alt_headline": article.get("summary", {}).get("title"),
-                "updated": article.get("updated").strftime("%Y-%m-%d %H:%M UTC") if article.get("updated") else "N/A",
-                "link": article.get("link"),
-                "summary": article.get("summary", {}).get("summary"),
-                "importance_score": article.get("summary", {}).get("importance", 0), # Keep numeric for template logic
-                "importance": "\U0001F525" * article.get("summary", {}).get("importance", 0),
-                "keywords": article.get("summary", {}).get("keywords"),
-                "category": article.get("summary", {}).get("category"),
-                "source": article.get("source")
-            })
-
-        # Topic summary data
-        topic_summary_data = topic.get('summary', {})
-        
-        processed_topics.append({
-            '_id': topic.get('_id'),
-            'updated': topic.get('updated').strftime("%Y-%m-%d %H:%M UTC") if topic.get('updated') else "N/A",
-            'source': topic.get('source'),
-            'title': topic_summary_data.get('title', 'Topic Title Missing'),
-            'summary_text': topic_summary_data.get('summary', 'Topic summary missing.'),
-            'importance_score': topic_summary_data.get('importance', 0),
-            'importance': "\U0001F525" * topic_summary_data.get('importance', 0),
-            'keywords': topic_summary_data.get('keywords', []),
-            'category': topic_summary_data.get('category', 'N/A'),
-            'articles': formatted_articles,
-            'article_count': len(formatted_articles)
-        })
-        
-    # Attempt to get a global last update time if possible, or use current time
-    # This might need refinement based on how 'run_start_time' is stored or if a global update marker exists
-    last_update_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if processed_topics and processed_topics[0]['articles']:
-        # Try to get from the latest article of the latest topic if available
-        # This assumes articles have 'run_start_time', which they do in 'display_news'
-        # However, formatted_articles above doesn't include it. For simplicity, using topic updated time.
-        latest_topic_update_dt = dateparser.parse(processed_topics[0]['updated'])
-        if latest_topic_update_dt:
-            last_update_time_str = latest_topic_update_dt.strftime("%Y-%m-%d %H:%M:%S")
-
-    return render_template("topics.html",
-                           topics=processed_topics,
-                           latest_daily_summary=latest_daily_summary, # Pass daily summary to template
-                           location="main", # Changed from "topics" to "main"
-                           update_time=last_update_time_str)
+    # The first page, with its articles and the daily summary, is precomputed by the ingest
+    page, feed = load_feed_snapshot(mongo_db, "main", 'time')
+    if page is not None:
+        latest_daily_summary = feed.get('latest_daily_summary')
+        topics = page.items
+        articles_by_topic = {topic['_id']: topic['articles'] for topic in topics}
+    else:
+        # Fetch the latest daily news summary
+        latest_daily_summary = mongo_db["news_summaries"].find_one(sort=[('date', -1)])
+        page, topics, articles_by_topic = load_live_topics(mongo_db)
+
+    return render_template("topics.html", **topics_page_context(page, topics, articles_by_topic, latest_daily_summary))
+
+def load_live_topics(mongo_db):
+    """
+    Returns:
+        tuple: The requested page of topics updated in the last 48 hours,
+        those of its topics that have stories, and their articles by topic
+    """
+    page = paginate(mongo_db["topics"], live_topics_query(), TOPIC_CARD_PROJECTION, 'time', *get_page_args(request.args))
+    # Skip topics that somehow have no story IDs
+    topics = [topic for topic in page.items if topic.get('stories')]
+    return page, topics, load_topic_articles(mongo_db["stories"], topics)
 
 @app.route('/topic/<topic_id>')
+@page_cache.cached
 def display_topic_detail(topic_id):
     mongo_db = get_mongo_client()["nb3000"]
     topics_collection = mongo_db["topics"]
     stories_collection = mongo_db["stories"]
 
-    try:
-        topic = topics_collection.find_one({"_id": ObjectId(topic_id)})
-    except Exception as e:
-        # Handle cases where topic_id might not be a valid ObjectId, though ObjectId() itself can raise InvalidId
-        print(f"Error fetching topic by ID {topic_id}: {e}")
+    oid = parse_id(topic_id)
+    if oid is None:
         return "Topic not found or invalid ID", 404
-
+    topic = topics_collection.find_one({"_id": oid}, TOPIC_CARD_PROJECTION)
     if not topic:
         return "Topic not found", 404
 
+    # Topics folded into another by compaction keep their URL working
+    if topic.get('merged_into'):
+        return redirect(url_for('display_topic_detail', topic_id=str(topic['merged_into'])), code=301)
+
     # Fetch associated articles for the topic
-    article_ids = topic.get('stories', [])
-    articles_in_topic = []
-    if article_ids:
-        object_id_article_ids = [ObjectId(id_val) for id_val in article_ids]
-        articles_cursor = stories_collection.find({
-            '_id': { '$in': object_id_article_ids }
-        }).sort('updated', -1) # Sort articles within topic by their update time
-        articles_in_topic = list(articles_cursor)
-
-    # Format articles for detailed display in the template
-    formatted_articles = []
-    for article in articles_in_topic:
-        formatted_articles.append({
-            "_id": article.get("_id"),
-            "headline": article.get("headline"),
-            "alt_headline": article.get("summary", {}).get("title"), # If the story was summarized, this is its title
-            "link": article.get("link"),
-            "source": article.get("source"),
-            "updated": article.get("updated").strftime("%Y-%m-%d %H:%M UTC") if article.get("updated") else "N/A",
-            "summary_text": article.get("summary", {}).get("summary"), # The article's own summary
-            "keywords": article.get("summary", {}).get("keywords"),
-            "category": article.get("summary", {}).get("category"),
-            "importance_score": article.get("summary", {}).get("importance", 0),
-            "importance_icons": "\U0001F525" * article.get("summary", {}).get("importance", 0)
-        })
-
-    # Prepare topic data for the template
-    topic_summary_data = topic.get('summary', {})
-    processed_topic = {
-        '_id': topic.get('_id'),
-        'title': topic_summary_data.get('title', 'Topic Title Missing'),
-        'summary_text': topic_summary_data.get('summary', 'Topic summary missing.'),
-        'updated': topic.get('updated').strftime("%Y-%m-%d %H:%M UTC") if topic.get('updated') else "N/A",
-        'source': topic.get('source'), # This is the topic's source, e.g., "multiple"
-        'keywords': topic_summary_data.get('keywords', []),
-        'category': topic_summary_data.get('category', 'N/A'),
-        'importance_score': topic_summary_data.get('importance', 0),
-        'importance_icons': "\U0001F525" * topic_summary_data.get('importance', 0),
-        'articles': formatted_articles,
-        'article_count': len(formatted_articles)
-    }
+    articles_in_topic = load_topic_articles(stories_collection, [topic])[topic['_id']]
+    processed_topic = TopicCard.from_doc(topic, articles_in_topic)
 
     return render_template("topic_detail.html", 
                            topic=processed_topic,
-                           location="topic_detail") # For potential nav highlighting or other logic
+                           location="topic_detail", # For potential nav highlighting or other logic
+                           feed_url=url_for('serve_feed', name=f'topic/{topic_id}.atom') if topic_feed_exists(topic_id) else None)
+
+# JSON API. Responses go through the same page cache and ETag handling as
+# the HTML pages.
+
+@app.route('/api/v1/stories')
+@page_cache.cached
+def api_stories():
+    sort = get_sort(request.args)
+    page = load_story_list(get_mongo_client()["nb3000"], request.args.get('category'), sort)
+    return json_response(story_page_json(page))
+
+@app.route('/api/v1/topics/<topic_id>')
+@page_cache.cached
+def api_topic(topic_id):
+    mongo_db = get_mongo_client()["nb3000"]
+    oid = parse_id(topic_id)
+    topic = mongo_db["topics"].find_one({"_id": oid}, TOPIC_CARD_PROJECTION) if oid else None
+    if not topic:
+        return json_response({'error': 'Topic not found'}, 404)
+    if topic.get('merged_into'):
+        return redirect(url_for('api_topic', topic_id=str(topic['merged_into'])), code=301)
+
+    articles = load_topic_articles(mongo_db["stories"], [topic])[topic['_id']]
+    return json_response(topic_json(topic, articles))
+
+@app.route('/api/v1/summary/latest')
+@page_cache.cached
+def api_latest_summary():
+    summary = get_mongo_client()["nb3000"]["news_summaries"].find_one({}, SUMMARY_PROJECTION, sort=[('date', -1)])
+    if summary is None:
+        return json_response({'error': 'No summary yet'}, 404)
+    return json_response(summary_json(summary))
+
+@app.route('/api/v1/changes')
+def api_changes():
+    """
+    Stories, topics and the daily summary changed since a cursor. Call
+    without since= to get the current cursor, then pass back the cursor of
+    each response. resync means the cursor predates the change log and the
+    client should reload everything.
+
+    Not page cached: since= also takes timestamps, which would fill the
+    cache with keys that are never asked for twice. Clients revalidate on
+    every poll (see http_cache.REVALIDATE_ENDPOINTS) and get a 304 from the
+    ETag while nothing has changed.
+    """
+    mongo_db = get_mongo_client()["nb3000"]
+    changes_col = mongo_db["changes"]
+    # Each run writes its entry before publishing its version, so every
+    # entry up to the version being served is in place
+    latest_version = data_version.current()
+
+    since = request.args.get('since', '')
+    if not since:
+        return json_response({'cursor': latest_version})
+    query = parse_since(since, latest_version)
+    if query is None:
+        return json_response({'error': 'since must be a data version or an ISO timestamp'}, 400)
+
+    oldest = changes_col.find_one({}, {'time': 1}, sort=[('_id', 1)])
+    if change_log_expired(since, query, oldest):
+        return json_response({'cursor': latest_version, 'resync': True})
+
+    entries = list(changes_col.find(query).sort('_id', 1).limit(MAX_CHANGE_ENTRIES + 1))
+    has_more = len(entries) > MAX_CHANGE_ENTRIES
+    entries = entries[:MAX_CHANGE_ENTRIES]
+    cursor = entries[-1]['_id'] if entries else (int(since) if since.isdigit() else latest_version)
+    changes = merge_change_log(entries)
+
+    stories = []
+    if changes.stories:
+        stories = list(mongo_db["stories"].find({'_id': {'$in': changes.stories}}, STORY_CARD_PROJECTION))
+    topics = []
+    if changes.topics:
+        topics = list(mongo_db["topics"].find({'_id': {'$in': changes.topics}, 'merged_into': {'$exists': False}},
+                                              TOPIC_CARD_PROJECTION))
+    articles_by_topic = load_topic_articles(mongo_db["stories"], topics)
+    summary = None
+    if changes.summary:
+        summary = mongo_db["news_summaries"].find_one({}, SUMMARY_PROJECTION, sort=[('date', -1)])
+
+    return json_response(changes_json(cursor, has_more, changes, stories, topics, articles_by_topic, summary))
+
+def init_worker():
+    """
+    Per-process setup for pre-forking servers, called after fork (see
+    gunicorn.conf.py): opens this worker's Mongo pool and forces a fresh
+    data version lookup.
+    """
+    reset_mongo_client()
+    data_version.checked = 0
+    ping_mongo()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    # Development server only; production runs under gunicorn (make serve_prod)
+    app.run(host='0.0.0.0', port=5001, debug=os.getenv('FLASK_DEBUG') == '1')
\ No newline at end of file
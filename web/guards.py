@@ -0,0 +1,87 @@
+import os
+import math
+from typing import List, Optional
+from ip_blocker import IPBlocker, client_network
+from rate_limit import RateLimiter
+from bot_filter import BotFilter
+
+# Only this many X-Forwarded-For hops are checked, so a forged header can't
+# make a request arbitrarily expensive
+MAX_FORWARDED_HOPS = 10
+
+# Routes that may reach Mongo with uncached queries get the smaller budget
+EXPENSIVE_ENDPOINTS = {'search_stories', 'api_topic', 'display_keyword', 'display_story', 'display_category', 'display_topic_detail'}
+RATE_LIMIT_EXEMPT_ENDPOINTS = {'static', 'serve_asset', 'serve_robots', 'serve_ads', 'health_check'}
+
+class RequestGuards:
+    """
+    The bot, IP and rate limit checks that run before every request, in
+    both flask_app and async_app. Requests can be Flask's or Quart's; only
+    headers, remote_addr, endpoint and path are used.
+    """
+    def __init__(self, ip_blocker: IPBlocker, bot_filter: BotFilter, rate_limiter: Optional[RateLimiter],
+                 trusted_proxies: int = 0, ipv4_prefix: int = 32):
+        self.ip_blocker = ip_blocker
+        self.bot_filter = bot_filter
+        self.rate_limiter = rate_limiter
+        # Number of reverse proxies in front of the app that append to X-Forwarded-For
+        self.trusted_proxies = trusted_proxies
+        # IPv4 clients are limited per address; IPv6 clients per /64
+        self.ipv4_prefix = ipv4_prefix
+
+    @classmethod
+    def from_env(cls) -> 'RequestGuards':
+        """
+        Builds the guards from bots.txt, BOT_LIST_FILES, IP_BLOCKLIST_FILES,
+        the RATE_LIMIT_* settings and TRUSTED_PROXIES.
+        """
+        ip_blocker = IPBlocker()
+        for path in os.getenv('IP_BLOCKLIST_FILES', '').split(os.pathsep):
+            if path:
+                ip_blocker.load_file(path)
+        return cls(ip_blocker, BotFilter.from_env(), RateLimiter.from_env(),
+                   int(os.getenv('TRUSTED_PROXIES', '0')), int(os.getenv('RATE_LIMIT_IPV4_PREFIX', '32')))
+
+    def client_ips(self, request) -> List[str]:
+        """
+        Returns:
+            list: The addresses in X-Forwarded-For, nearest hops last, followed by
+            the address of the peer that connected to us
+        """
+        ips = []
+        forwarded_for = request.headers.get('X-Forwarded-For')
+        if forwarded_for:
+            ips = [ip.strip() for ip in forwarded_for.split(',')[-MAX_FORWARDED_HOPS:]]
+        if request.remote_addr:
+            ips.append(request.remote_addr)
+        return ips
+
+    def check(self, request) -> Optional[tuple]:
+        """
+        Returns:
+            tuple: The (body, status, headers) to answer with instead of
+            running the view, or None if the request may go ahead
+        """
+        # Check if user agent contains any known bot identifiers
+        user_agent = request.headers.get('User-Agent', '')
+        bot = self.bot_filter.match(user_agent)
+        if bot is not None:
+            self.bot_filter.record_block(bot, user_agent, request.path)
+            return "Forbidden", 403, {}
+
+        # Check all IPs in X-Forwarded-For, and the peer address
+        ips = self.client_ips(request)
+        for ip in ips:
+            if self.ip_blocker.is_blocked(ip):
+                return "Forbidden", 403, {}
+
+        if self.rate_limiter is None or request.endpoint in RATE_LIMIT_EXEMPT_ENDPOINTS:
+            return None
+        # The client is the hop just before our trusted proxies
+        ip = ips[max(0, len(ips) - 1 - self.trusted_proxies)] if ips else ''
+        client = client_network(ip, self.ipv4_prefix) or ip
+        budget = 'expensive' if request.endpoint in EXPENSIVE_ENDPOINTS else 'cheap'
+        wait = self.rate_limiter.check(client, budget)
+        if wait > 0:
+            return "Too many requests", 429, {'Retry-After': str(math.ceil(wait))}
+        return None
@@ -0,0 +1,24 @@
+# Production WSGI configuration: gunicorn -c web/gunicorn.conf.py flask_app:app
+import os
+import multiprocessing
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.getenv("BIND", "0.0.0.0:5001")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Requests mostly wait on Mongo, so a few threads per worker keep the CPU busy
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+# Import the app (templates, bot lists, IP ranges) once in the master and
+# share it copy-on-write with the workers
+preload_app = True
+timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth
+max_requests = 5000
+max_requests_jitter = 500
+accesslog = "-"
+
+def post_fork(server, worker):
+    # Connection pools, sockets and locks must not be shared with the master
+    import flask_app
+    flask_app.init_worker()
@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Tuple
+from flask import Request, Response
+from data_version import DataVersion
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('text/html', 'application/json', 'application/xml', 'text/xml')
+# Below this size compression costs more than it saves
+MIN_COMPRESS_SIZE = 1024
+# How long browsers and proxies may reuse a page without asking again
+PAGE_MAX_AGE = 600
+# Polled for freshness, so clients revalidate on every request; the ETag
+# keeps that to a 304 while nothing has changed
+REVALIDATE_ENDPOINTS = {'api_changes', 'health_check'}
+
+class CompressedBodies:
+    """
+    Small LRU of compressed bodies keyed by ETag, so a popular page is
+    compressed once per data version rather than once per request.
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, etag: str, body: bytes, encoding: str) -> bytes:
+        with self.lock:
+            compressed = self.entries.get(etag)
+            if compressed is not None:
+                self.entries.move_to_end(etag)
+                return compressed
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=5)
+        else:
+            compressed = gzip.compress(body, compresslevel=6)
+        with self.lock:
+            self.entries[etag] = compressed
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return compressed
+
+compressed_bodies = CompressedBodies()
+
+def choose_encoding(request: Request) -> str:
+    if brotli is not None and 'br' in request.accept_encodings:
+        return 'br'
+    if 'gzip' in request.accept_encodings:
+        return 'gzip'
+    return ''
+
+def set_cache_control(response, request):
+    """
+    Default Cache-Control for responses that didn't set their own lifetime
+    (fingerprinted assets are immutable).
+    """
+    if response.cache_control.immutable:
+        return
+    if request.endpoint in REVALIDATE_ENDPOINTS:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.max_age = PAGE_MAX_AGE
+
+def _finalizable(response, request) -> bool:
+    return (request.method in ('GET', 'HEAD') and response.status_code == 200
+            and response.mimetype in COMPRESSIBLE_MIMETYPES)
+
+def _tag(response, request, data_version: DataVersion, body: bytes) -> Tuple[str, str]:
+    """
+    Sets the ETag and Last-Modified of a dynamic page.
+
+    The ETag combines the data version with a hash of the body, plus the
+    content coding, since each coding is a distinct representation.
+    Last-Modified is the start time of the ingest run that produced the
+    current data version.
+
+    Returns:
+        tuple: The ETag and the content coding to compress with, if any
+    """
+    encoding = choose_encoding(request) if len(body) >= MIN_COMPRESS_SIZE else ''
+    etag = f'{data_version.current()}-{hashlib.sha1(body).hexdigest()[:20]}'
+    if encoding:
+        etag += '-' + encoding
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if data_version.run_start_time is not None:
+        response.last_modified = data_version.run_start_time
+    return etag, encoding
+
+def finalize_response(response: Response, request: Request, data_version: DataVersion) -> Response:
+    """
+    Adds a strong ETag and Last-Modified to a dynamic page, answers 304 if
+    the client's copy is current, and otherwise compresses the body.
+    """
+    if not _finalizable(response, request) or response.direct_passthrough:
+        return response
+
+    body = response.get_data()
+    etag, encoding = _tag(response, request, data_version, body)
+    response.make_conditional(request)
+    if response.status_code == 304 or not encoding:
+        return response
+
+    response.set_data(compressed_bodies.get(etag, body, encoding))
+    response.content_encoding = encoding
+    return response
+
+async def finalize_async_response(response, request, data_version: DataVersion):
+    """
+    finalize_response for Quart responses, whose body and conditional
+    handling are async.
+    """
+    # Files and streams aren't buffered in memory
+    if not _finalizable(response, request) or not isinstance(response.response, response.data_body_class):
+        return response
+
+    body = await response.get_data()
+    etag, encoding = _tag(response, request, data_version, body)
+    await response.make_conditional(request)
+    if response.status_code == 304 or not encoding:
+        return response
+
+    response.set_data(compressed_bodies.get(etag, body, encoding))
+    response.content_encoding = encoding
+    return response
@@ -1,9 +1,55 @@
+import bisect
 import ipaddress
-from typing import List, Set
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+def parse_ip(ip: str) -> Union[ipaddress.IPv4Address, ipaddress.IPv6Address]:
+    """
+    Parse an IPv4 or IPv6 address, unwrapping IPv4 clients seen through an
+    IPv6 socket (::ffff:a.b.c.d)
+    
+    Raises:
+        ValueError: If ip is not a valid address
+    """
+    ip_addr = ipaddress.ip_address(ip.strip())
+    if ip_addr.version == 6 and ip_addr.ipv4_mapped is not None:
+        ip_addr = ip_addr.ipv4_mapped
+    return ip_addr
+
+def client_network(ip: str, ipv4_prefix: int = 32, ipv6_prefix: int = 64) -> Optional[str]:
+    """
+    Get the network an address belongs to, for treating a subnet as a single
+    client (IPv6 clients typically get a whole /64)
+    
+    Args:
+        ip: IP address (e.g., "1.2.3.4")
+        ipv4_prefix: Prefix length to group IPv4 addresses by
+        ipv6_prefix: Prefix length to group IPv6 addresses by
+        
+    Returns:
+        str: The network in CIDR notation, or None for an invalid address
+    """
+    try:
+        ip_addr = parse_ip(ip)
+    except ValueError:
+        return None
+    prefix = ipv4_prefix if ip_addr.version == 4 else ipv6_prefix
+    return str(ipaddress.ip_network((ip_addr, prefix), strict=False))
 
 class IPBlocker:
-    def __init__(self):
-        self.blocked_ranges: Set[ipaddress.IPv4Network] = set()
+    """
+    Blocks IPv4 and IPv6 addresses by CIDR range. Ranges are merged into
+    sorted, non-overlapping intervals per IP version, so a lookup is one
+    binary search, and recent verdicts are kept in a small LRU.
+    """
+    def __init__(self, cache_size: int = 4096):
+        self.blocked_ranges: Set[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]] = set()
+        self.cache_size = cache_size
+        self._starts: Dict[int, List[int]] = {4: [], 6: []}
+        self._ends: Dict[int, List[int]] = {4: [], 6: []}
+        self._cache: OrderedDict[str, bool] = OrderedDict()
+        self._cache_lock = threading.Lock()
         self._init_alibaba_ranges()
 
     def _init_alibaba_ranges(self):
@@ -118,29 +164,96 @@ class IPBlocker:
             # Add more ranges as needed
         ]
         
-        for range_str in alibaba_ranges:
-            try:
-                network = ipaddress.IPv4Network(range_str)
-                self.blocked_ranges.add(network)
-            except ValueError as e:
-                print(f"Warning: Invalid IP range {range_str}: {e}")
+        self.add_ranges(alibaba_ranges)
+
+    def _rebuild(self):
+        """
+        Rebuild the lookup tables from blocked_ranges: per IP version, sorted
+        and merged [start, end] integer intervals. Clears the verdict cache.
+        """
+        for version in (4, 6):
+            intervals = sorted(
+                (int(n.network_address), int(n.broadcast_address))
+                for n in self.blocked_ranges if n.version == version
+            )
+            starts, ends = [], []
+            for start, end in intervals:
+                if starts and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._starts[version] = starts
+            self._ends[version] = ends
+        with self._cache_lock:
+            self._cache.clear()
 
     def is_blocked(self, ip: str) -> bool:
         """
         Check if an IP address is in any of the blocked ranges
         
         Args:
-            ip: IP address to check (e.g., "1.2.3.4")
+            ip: IPv4 or IPv6 address to check (e.g., "1.2.3.4")
             
         Returns:
             bool: True if IP is blocked, False otherwise
         """
+        with self._cache_lock:
+            verdict = self._cache.get(ip)
+            if verdict is not None:
+                self._cache.move_to_end(ip)
+                return verdict
+
         try:
-            ip_addr = ipaddress.IPv4Address(ip)
-            return any(ip_addr in network for network in self.blocked_ranges)
+            ip_addr = parse_ip(ip)
+            value = int(ip_addr)
+            starts = self._starts[ip_addr.version]
+            i = bisect.bisect_right(starts, value) - 1
+            verdict = i >= 0 and value <= self._ends[ip_addr.version][i]
         except ValueError:
             # Invalid IP address format
-            return False
+            verdict = False
+
+        with self._cache_lock:
+            self._cache[ip] = verdict
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verdict
+
+    def add_ranges(self, range_strs: Iterable[str]) -> int:
+        """
+        Add many IP ranges at once, rebuilding the lookup tables only once
+        
+        Args:
+            range_strs: IP ranges in CIDR notation (IPv4 or IPv6)
+            
+        Returns:
+            int: Number of ranges that were valid and added
+        """
+        added = 0
+        for range_str in range_strs:
+            try:
+                self.blocked_ranges.add(ipaddress.ip_network(range_str.strip(), strict=False))
+                added += 1
+            except ValueError as e:
+                print(f"Warning: Invalid IP range {range_str}: {e}")
+        self._rebuild()
+        return added
+
+    def load_file(self, path: str) -> int:
+        """
+        Add the IP ranges listed in a file, one CIDR per line. Blank lines and
+        lines starting with '#' are ignored.
+        
+        Args:
+            path: Path of the CIDR list file
+            
+        Returns:
+            int: Number of ranges added
+        """
+        with open(path) as f:
+            lines = [line.strip() for line in f]
+        return self.add_ranges(line for line in lines if line and not line.startswith('#'))
 
     def add_range(self, range_str: str) -> bool:
         """
@@ -153,11 +266,12 @@ class IPBlocker:
             bool: True if range was added successfully, False otherwise
         """
         try:
-            network = ipaddress.IPv4Network(range_str)
-            self.blocked_ranges.add(network)
-            return True
+            network = ipaddress.ip_network(range_str, strict=False)
         except ValueError:
             return False
+        self.blocked_ranges.add(network)
+        self._rebuild()
+        return True
 
     def remove_range(self, range_str: str) -> bool:
         """
@@ -170,13 +284,14 @@ class IPBlocker:
             bool: True if range was removed successfully, False otherwise
         """
         try:
-            network = ipaddress.IPv4Network(range_str)
-            if network in self.blocked_ranges:
-                self.blocked_ranges.remove(network)
-                return True
-            return False
+            network = ipaddress.ip_network(range_str, strict=False)
         except ValueError:
             return False
+        if network not in self.blocked_ranges:
+            return False
+        self.blocked_ranges.remove(network)
+        self._rebuild()
+        return True
 
     def get_blocked_ranges(self) -> List[str]:
         """
@@ -185,4 +300,4 @@ class IPBlocker:
         Returns:
             List[str]: List of blocked IP ranges in CIDR notation
         """
-        return [str(network) for network in sorted(self.blocked_ranges)] 
\ No newline at end of file
+        return [str(network) for network in sorted(self.blocked_ranges, key=lambda n: (n.version, n))]
@@ -0,0 +1,278 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+import functools
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+from flask import request, make_response, copy_current_request_context
+from data_version import DataVersion
+
+try:
+    import quart
+except ImportError:
+    quart = None
+
+# Next to the search index and feeds, in a directory the app owns.
+# PAGE_CACHE_PATH overrides it.
+DEFAULT_PAGE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'page_cache.sqlite3')
+
+class CachedPage(NamedTuple):
+    version: int
+    created: float
+    body: bytes
+    mimetype: str
+
+class LRUBackend:
+    """
+    In-process LRU of rendered pages. Each worker process has its own copy.
+    """
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple, CachedPage] = OrderedDict()
+        # Page -> newest version cached for it
+        self.latest: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, page: str, version: int) -> Optional[CachedPage]:
+        with self.lock:
+            entry = self.entries.get((page, version))
+            if entry is not None:
+                self.entries.move_to_end((page, version))
+            return entry
+
+    def newest(self, page: str) -> Optional[CachedPage]:
+        with self.lock:
+            version = self.latest.get(page)
+            return None if version is None else self.entries.get((page, version))
+
+    def set(self, page: str, entry: CachedPage):
+        with self.lock:
+            # Older renders of the page are only needed until a newer one exists
+            previous = self.latest.get(page)
+            if previous is not None and previous < entry.version:
+                self.entries.pop((page, previous), None)
+            if previous is None or previous <= entry.version:
+                self.latest[page] = entry.version
+            self.entries[(page, entry.version)] = entry
+            self.entries.move_to_end((page, entry.version))
+            while len(self.entries) > self.max_entries:
+                (old_page, old_version), _ = self.entries.popitem(last=False)
+                if self.latest.get(old_page) == old_version:
+                    del self.latest[old_page]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.latest.clear()
+
+class SqliteBackend:
+    """
+    Page cache in a local SQLite file, shared by all worker processes on the
+    host. Rows are keyed by page and data version, so workers that haven't
+    noticed a new version yet write alongside newer rows rather than over
+    them.
+    """
+    def __init__(self, path: str, max_entries: int = 4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""CREATE TABLE IF NOT EXISTS page_versions (
+            page TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            created REAL NOT NULL,
+            body BLOB NOT NULL,
+            mimetype TEXT NOT NULL,
+            PRIMARY KEY (page, version)
+        )""")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Connections can't be shared across threads or forks
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, page: str, version: int) -> Optional[CachedPage]:
+        row = self._conn().execute(
+            'SELECT version, created, body, mimetype FROM page_versions WHERE page = ? AND version = ?',
+            (page, version)
+        ).fetchone()
+        return CachedPage(*row) if row else None
+
+    def newest(self, page: str) -> Optional[CachedPage]:
+        row = self._conn().execute(
+            'SELECT version, created, body, mimetype FROM page_versions WHERE page = ? ORDER BY version DESC LIMIT 1',
+            (page,)
+        ).fetchone()
+        return CachedPage(*row) if row else None
+
+    def set(self, page: str, entry: CachedPage):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO page_versions (page, version, created, body, mimetype) VALUES (?, ?, ?, ?, ?)',
+                     (page, entry.version, entry.created, entry.body, entry.mimetype))
+        conn.execute('DELETE FROM page_versions WHERE page = ? AND version < ?', (page, entry.version))
+        self.writes += 1
+        if self.writes % 100 == 0:
+            conn.execute('DELETE FROM page_versions WHERE rowid IN '
+                         '(SELECT rowid FROM page_versions ORDER BY created DESC LIMIT -1 OFFSET ?)',
+                         (self.max_entries,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute('DELETE FROM page_versions')
+        conn.commit()
+
+class PageCache:
+    """
+    Server-side cache of rendered pages, keyed by route, query arguments and
+    the data version they were rendered at. After an ingest bumps the
+    version, the newest older render is served for up to stale_ttl seconds
+    while a background thread renders the page at the new version.
+    """
+    def __init__(self, backend, data_version: DataVersion, stale_ttl: float = 600):
+        self.backend = backend
+        self.data_version = data_version
+        self.stale_ttl = stale_ttl
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def _lookup(self, page: str, version: int) -> Tuple[Optional[CachedPage], str]:
+        """
+        Returns:
+            tuple: The entry to serve and 'HIT' or 'STALE', or (None, 'MISS')
+            if the page has to be rendered first
+        """
+        entry = self.backend.get(page, version)
+        if entry is not None:
+            return entry, 'HIT'
+        entry = self.backend.newest(page)
+        if entry is not None and entry.version > version:
+            # Another worker has already seen the new version
+            return entry, 'HIT'
+        if entry is not None and time.time() - entry.created < self.stale_ttl:
+            return entry, 'STALE'
+        return None, 'MISS'
+
+    def _start_refresh(self, key: tuple) -> bool:
+        with self.lock:
+            if key in self.refreshing:
+                return False
+            self.refreshing.add(key)
+            return True
+
+    def _end_refresh(self, key: tuple):
+        with self.lock:
+            self.refreshing.discard(key)
+
+    def cached(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if self.backend is None:
+                return view(*args, **kwargs)
+            page = page_key(request)
+            version = self.data_version.current()
+            entry, status = self._lookup(page, version)
+            if status == 'STALE':
+                self._refresh_in_background(page, version, view, args, kwargs)
+            if entry is not None:
+                return self._response(entry, status)
+            response = self._render(page, version, view, args, kwargs)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+
+    def _render(self, page, version, view, args, kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            self.backend.set(page, CachedPage(version, time.time(), response.get_data(), response.mimetype))
+        return response
+
+    def _refresh_in_background(self, page, version, view, args, kwargs):
+        key = (page, version)
+        if not self._start_refresh(key):
+            return
+
+        @copy_current_request_context
+        def refresh():
+            try:
+                self._render(page, version, view, args, kwargs)
+            except Exception as e:
+                print(f"Error refreshing cached page {page}: {e}")
+            finally:
+                self._end_refresh(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _response(self, entry: CachedPage, status: str):
+        response = make_response(entry.body)
+        response.mimetype = entry.mimetype
+        response.headers['X-Cache'] = status
+        return response
+
+    def cached_async(self, view):
+        """
+        cached() for Quart views. Stale pages are re-rendered in a task on
+        the worker's event loop.
+        """
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            if self.backend is None:
+                return await view(*args, **kwargs)
+            page = page_key(quart.request)
+            version = self.data_version.current()
+            entry, status = self._lookup(page, version)
+            if status == 'STALE':
+                key = (page, version)
+                if self._start_refresh(key):
+                    @quart.copy_current_request_context
+                    async def refresh():
+                        try:
+                            await self._render_async(page, version, view, args, kwargs)
+                        except Exception as e:
+                            print(f"Error refreshing cached page {page}: {e}")
+                        finally:
+                            self._end_refresh(key)
+                    asyncio.get_running_loop().create_task(refresh())
+            if entry is not None:
+                response = await quart.make_response(entry.body)
+                response.mimetype = entry.mimetype
+                response.headers['X-Cache'] = status
+                return response
+            response = await self._render_async(page, version, view, args, kwargs)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+
+    async def _render_async(self, page, version, view, args, kwargs):
+        response = await quart.make_response(await view(*args, **kwargs))
+        if response.status_code == 200 and isinstance(response.response, response.data_body_class):
+            self.backend.set(page, CachedPage(version, time.time(), await response.get_data(), response.mimetype))
+        return response
+
+def page_key(request) -> str:
+    # Route and query arguments, in a canonical order
+    return request.path + '?' + '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+
+def backend_from_env():
+    """
+    Picks the page cache backend from PAGE_CACHE_BACKEND: 'lru' (default),
+    'sqlite' or 'none'.
+    """
+    kind = os.getenv('PAGE_CACHE_BACKEND', 'lru').lower()
+    max_entries = int(os.getenv('PAGE_CACHE_SIZE', '512'))
+    if kind == 'none':
+        return None
+    if kind == 'sqlite':
+        path = os.getenv('PAGE_CACHE_PATH') or DEFAULT_PAGE_CACHE_PATH
+        return SqliteBackend(path, max_entries)
+    return LRUBackend(max_entries)
@@ -0,0 +1,203 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from pagination import Page, PAGE_SIZE, MAX_PAGE_SIZE, SORT_KEYS, encode_cursor
+from search import SearchResults, ORDER_BY as SEARCH_ORDERS, search_offset
+from view_models import StoryCard, TopicCard, format_time, importance_icons
+
+# Queries and template context for the pages, shared by flask_app and
+# async_app. The apps only differ in how they run the queries.
+
+# Feed snapshots older than this (the ingest only writes them when it finds
+# new stories) are ignored in favor of live queries
+FEED_MAX_AGE = timedelta(hours=6)
+
+# How far back each list looks
+STORIES_HORIZON = timedelta(days=1)
+CATEGORY_HORIZON = timedelta(days=14)
+TOPICS_HORIZON = timedelta(hours=48)
+
+# Atom and RSS files written by the ingest (cron/syndication.py)
+FEEDS_DIR = os.getenv('FEEDS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'feeds')
+FEED_MIMETYPES = {'.atom': 'application/atom+xml', '.rss': 'application/rss+xml'}
+
+def feed_mimetype(name: str) -> Optional[str]:
+    return FEED_MIMETYPES.get(os.path.splitext(name)[1])
+
+def topic_feed_exists(topic_id: str) -> bool:
+    # Only active topics have a feed
+    return os.path.exists(os.path.join(FEEDS_DIR, 'topic', f'{topic_id}.atom'))
+
+def parse_id(value: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+def get_sort(args) -> str:
+    sort = args.get('sort')
+    if sort != 'time' and sort != 'importance':
+        sort = 'time'
+    return sort
+
+def get_page_args(args) -> Tuple[Optional[str], Optional[str], int]:
+    """
+    Returns:
+        tuple: The (after, before, limit) pagination arguments of the request
+    """
+    try:
+        limit = int(args.get('limit', PAGE_SIZE))
+    except ValueError:
+        limit = PAGE_SIZE
+    return args.get('after'), args.get('before'), limit
+
+def story_list_source(category: Optional[str], sort: str) -> Tuple[Optional[str], dict]:
+    """
+    Returns:
+        tuple: The id of the ingest's snapshot of the list's first page, or
+        None if there isn't one, and the live query for the list. Without a
+        category the list is /stories.
+    """
+    now = datetime.now()
+    if not category:
+        return f"stories:{sort}", {'updated': {'$gt': now - STORIES_HORIZON}}
+    # Only top-level categories are precomputed
+    feed_id = f"category/{category}:{sort}" if '/' not in category else None
+    return feed_id, {'updated': {'$gt': now - CATEGORY_HORIZON}, 'summary.categories': category}
+
+def live_topics_query() -> dict:
+    return {'updated': {'$gte': datetime.now() - TOPICS_HORIZON}, 'merged_into': {'$exists': False}}
+
+def keyword_query(keyword: str, keyword_doc: dict) -> dict:
+    # Similar keywords (score >= 0.9) are maintained by the ingest
+    keywords = keyword_doc.get("similar_keywords") or [keyword]
+    return {'summary.keywords': {"$in": keywords}}
+
+def wants_snapshot(args) -> bool:
+    # Snapshots only hold the first page at the default size
+    return not any(args.get(arg) for arg in ('after', 'before', 'limit'))
+
+def snapshot_page(feed: Optional[dict], sort: str) -> Optional[Page]:
+    """
+    Turns a feed snapshot written by the ingest (cron/feeds.py) into the
+    first page of its list.
+
+    Returns:
+        Page: The page, or None if the snapshot is missing or too old to trust
+    """
+    if feed is None or feed['generated'] < datetime.now() - FEED_MAX_AGE:
+        return None
+    items = feed['items']
+    next_cursor = encode_cursor(items[-1], SORT_KEYS[sort]) if items and feed['has_more'] else None
+    return Page(items, next_cursor, None)
+
+def topic_articles_query(topics: List[dict]) -> Tuple[Optional[dict], Dict[ObjectId, list]]:
+    """
+    Plans a single $in query for the articles of all the given topics. Run
+    it sorted by updated, descending, and pass the results to
+    group_topic_articles.
+
+    Returns:
+        tuple: The query, or None if the topics have no articles, and the
+        topic ids of each article
+    """
+    # An article can be listed by more than one topic
+    topics_by_article = {}
+    for topic in topics:
+        for id_val in topic.get('stories', []):
+            topics_by_article.setdefault(ObjectId(id_val), []).append(topic['_id'])
+    if not topics_by_article:
+        return None, topics_by_article
+    return {'_id': {'$in': list(topics_by_article)}}, topics_by_article
+
+def group_topic_articles(topics: List[dict], topics_by_article: Dict[ObjectId, list], articles: List[dict]) -> dict:
+    """
+    Returns:
+        dict: Topic _id -> list of its articles, in the order given
+    """
+    articles_by_topic = {topic['_id']: [] for topic in topics}
+    for article in articles:
+        for topic_id in topics_by_article[article['_id']]:
+            articles_by_topic[topic_id].append(article)
+    return articles_by_topic
+
+def story_list_context(page: Page, sort: str, location: str, **kwargs) -> dict:
+    """
+    Returns:
+        dict: The context for news.html
+    """
+    stories = page.items
+    # Handle case where there might be no stories after filtering
+    if not stories:
+        last_update_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    else:
+        last_update_time = max(stories, key=lambda story: story['run_start_time'])['run_start_time']
+        last_update_time_str = last_update_time.strftime("%Y-%m-%d %H:%M:%S")
+
+    return dict(
+        stories=[StoryCard.from_doc(story) for story in stories],
+        sort_by=sort,
+        location=location,
+        update_time=last_update_time_str,
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor,
+        **kwargs)
+
+def story_page_context(story: dict, similar_stories: List[dict]) -> dict:
+    """
+    Returns:
+        dict: The context for story.html
+    """
+    for s in similar_stories:
+        s['updated'] = format_time(s.get('updated'))
+    return dict(
+        story=story,
+        similar_stories=similar_stories,
+        importance=importance_icons(story.get("summary", {}).get("importance", 0)))
+
+def topics_page_context(page: Page, topics: List[dict], articles_by_topic: dict,
+                        latest_daily_summary: Optional[dict]) -> dict:
+    """
+    Returns:
+        dict: The context for topics.html
+    """
+    processed_topics = [TopicCard.from_doc(topic, articles_by_topic[topic['_id']]) for topic in topics]
+
+    # Use the update time of the latest topic if there is one, or current time
+    last_update_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if processed_topics and processed_topics[0].articles and topics[0].get('updated'):
+        last_update_time_str = topics[0]['updated'].strftime("%Y-%m-%d %H:%M:%S")
+
+    return dict(
+        topics=processed_topics,
+        latest_daily_summary=latest_daily_summary,
+        location="main",
+        update_time=last_update_time_str,
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor)
+
+def search_args(args) -> Tuple[str, str, int, int]:
+    """
+    Returns:
+        tuple: The (query, sort, offset, limit) of a search request
+    """
+    query = args.get('q', '').strip()
+    sort = args.get('sort')
+    if sort not in SEARCH_ORDERS:
+        sort = 'relevance'
+    after, before, limit = get_page_args(args)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return query, sort, search_offset(after, before, limit), limit
+
+def search_page(results: SearchResults, stories: List[dict], offset: int, limit: int) -> Page:
+    """
+    Orders the stories found for a search by rank, skipping any that have
+    been deleted since they were indexed.
+    """
+    by_id = {s['_id']: s for s in stories}
+    items = [by_id[i] for i in results.ids if i in by_id]
+    next_cursor = str(offset + limit) if results.has_more else None
+    prev_cursor = str(offset) if offset > 0 else None
+    return Page(items, next_cursor, prev_cursor)
@@ -0,0 +1,125 @@
+import json
+import base64
+from datetime import datetime
+from typing import Any, List, NamedTuple, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from nb3000.listing import PAGE_SIZE, SORT_KEYS
+
+MAX_PAGE_SIZE = 100
+
+class Page(NamedTuple):
+    items: List[dict]
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+def _get_path(doc: dict, path: str) -> Any:
+    for part in path.split('.'):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+def encode_cursor(doc: dict, keys: List[Tuple[str, int]]) -> str:
+    """
+    Encodes the position of doc in the given ordering as an opaque,
+    URL-safe token.
+    """
+    values = []
+    for field, _ in keys:
+        value = _get_path(doc, field)
+        if isinstance(value, datetime):
+            value = {'d': value.isoformat()}
+        elif isinstance(value, ObjectId):
+            value = {'o': str(value)}
+        values.append(value)
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(token: str, keys: List[Tuple[str, int]]) -> Optional[List[Any]]:
+    """
+    Returns:
+        list: The key values encoded by encode_cursor, or None if the token is
+        malformed or doesn't match the ordering
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        decoded = []
+        for value in values:
+            if isinstance(value, dict) and 'd' in value:
+                value = datetime.fromisoformat(value['d'])
+            elif isinstance(value, dict) and 'o' in value:
+                value = ObjectId(value['o'])
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError, InvalidId):
+        return None
+
+def keyset_filter(keys: List[Tuple[str, int]], values: List[Any], forward: bool = True) -> dict:
+    """
+    Builds the filter for documents strictly after (forward) or before the
+    given position in the ordering.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(keys):
+        op = '$lt' if (direction < 0) == forward else '$gt'
+        clause = {f: v for (f, _), v in zip(keys[:i], values[:i])}
+        clause[field] = {op: values[i]}
+        clauses.append(clause)
+    # The redundant bound on the leading key lets the planner turn the $or
+    # into a range scan of the sort index instead of a filter over it.
+    field, direction = keys[0]
+    bound = '$lte' if (direction < 0) == forward else '$gte'
+    return {field: {bound: values[0]}, '$or': clauses}
+
+class PageQuery(NamedTuple):
+    query: dict
+    sort: List[Tuple[str, int]]
+    limit: int
+    keys: List[Tuple[str, int]]
+    after: bool
+    before: Optional[str]
+
+def page_query(query: dict, sort: str, after: Optional[str] = None, before: Optional[str] = None,
+               limit: int = PAGE_SIZE) -> PageQuery:
+    """
+    Plans the query for one page in the given SORT_KEYS ordering, starting
+    after the 'after' cursor or ending before the 'before' cursor. Run it
+    with find(q.query).sort(q.sort).limit(q.limit) and pass the results to
+    build_page.
+    """
+    keys = SORT_KEYS[sort]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after_values = decode_cursor(after, keys) if after else None
+    before_values = decode_cursor(before, keys) if before and not after_values else None
+
+    if before_values:
+        # Walk backwards from the cursor, build_page restores the display order
+        query = {'$and': [query, keyset_filter(keys, before_values, forward=False)]}
+        sort_spec = [(field, -direction) for field, direction in keys]
+    else:
+        if after_values:
+            query = {'$and': [query, keyset_filter(keys, after_values)]}
+        sort_spec = keys
+    return PageQuery(query, sort_spec, limit + 1, keys, bool(after_values), before if before_values else None)
+
+def build_page(q: PageQuery, items: List[dict]) -> Page:
+    limit = q.limit - 1
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    if q.before:
+        items.reverse()
+        next_cursor = encode_cursor(items[-1], q.keys) if items else q.before
+        prev_cursor = encode_cursor(items[0], q.keys) if items and has_more else None
+    else:
+        next_cursor = encode_cursor(items[-1], q.keys) if items and has_more else None
+        prev_cursor = encode_cursor(items[0], q.keys) if items and q.after else None
+    return Page(items, next_cursor, prev_cursor)
+
+def paginate(collection, query: dict, projection: Optional[dict], sort: str,
+             after: Optional[str] = None, before: Optional[str] = None, limit: int = PAGE_SIZE) -> Page:
+    """
+    Fetches one page of query results in the given SORT_KEYS ordering.
+    """
+    q = page_query(query, sort, after, before, limit)
+    return build_page(q, list(collection.find(q.query, projection).sort(q.sort).limit(q.limit)))
@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+class Budget(NamedTuple):
+    capacity: float
+    refill_per_second: float
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Budget':
+        """
+        Parses "<requests>/<seconds>", e.g. "30/60" allows a burst of 30
+        requests and refills at 30 requests per minute.
+        """
+        requests, seconds = spec.split('/')
+        return cls(float(requests), float(requests) / float(seconds))
+
+class MemoryBuckets:
+    """
+    Token buckets in this process only.
+    """
+    def __init__(self):
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.lock = threading.Lock()
+
+    def take(self, key: str, budget: Budget, now: float) -> float:
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (budget.capacity, now))
+            tokens, wait = _take(tokens, updated, budget, now)
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > 100000:
+                self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < 3600}
+            return wait
+
+class SqliteBuckets:
+    """
+    Token buckets in a SQLite file shared by all worker processes on the
+    host. The default location is under /dev/shm, so the file lives in
+    shared memory.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self.takes = 0
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA synchronous=OFF')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def take(self, key: str, budget: Budget, now: float) -> float:
+        conn = self._conn()
+        # Serializes read-modify-write of the bucket across processes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (budget.capacity, now)
+            tokens, wait = _take(tokens, updated, budget, now)
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+            self.takes += 1
+            if self.takes % 1000 == 0:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 3600,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+def _take(tokens: float, updated: float, budget: Budget, now: float) -> Tuple[float, float]:
+    """
+    Refills a bucket for the time since it was last updated and takes one
+    token from it.
+
+    Returns:
+        tuple: (tokens left, seconds to wait before retrying, 0 if allowed)
+    """
+    tokens = min(budget.capacity, tokens + (now - updated) * budget.refill_per_second)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / budget.refill_per_second
+
+class RateLimiter:
+    """
+    Per-client token buckets, with a separate budget per class of route.
+    """
+    def __init__(self, buckets, budgets: Dict[str, Budget]):
+        self.buckets = buckets
+        self.budgets = budgets
+
+    @classmethod
+    def from_env(cls) -> Optional['RateLimiter']:
+        """
+        RATE_LIMIT_BACKEND picks 'sqlite' (default, shared by workers),
+        'memory' or 'none'. RATE_LIMIT_EXPENSIVE and RATE_LIMIT_CHEAP set
+        the budgets as "<requests>/<seconds>".
+        """
+        kind = os.getenv('RATE_LIMIT_BACKEND', 'sqlite').lower()
+        if kind == 'none':
+            return None
+        budgets = {
+            'expensive': Budget.parse(os.getenv('RATE_LIMIT_EXPENSIVE', '30/60')),
+            'cheap': Budget.parse(os.getenv('RATE_LIMIT_CHEAP', '120/60')),
+        }
+        if kind == 'memory':
+            return cls(MemoryBuckets(), budgets)
+        shm = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        return cls(SqliteBuckets(os.getenv('RATE_LIMIT_PATH', os.path.join(shm, 'nb3000_rate_limit.sqlite3'))), budgets)
+
+    def check(self, client: str, budget_name: str) -> float:
+        """
+        Takes a request from the client's budget.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the seconds until it would be
+        """
+        try:
+            return self.buckets.take(f'{budget_name}:{client}', self.budgets[budget_name], time.time())
+        except sqlite3.Error as e:
+            # Fail open: a busy or broken store must not take the site down
+            print(f"Rate limiter error: {e}")
+            return 0.0
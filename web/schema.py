@@ -0,0 +1,172 @@
+import sys
+import argparse
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from db import get_mongo_client
+from pagination import SORT_KEYS, PAGE_SIZE, keyset_filter
+from view_models import STORY_CARD_PROJECTION, TOPIC_CARD_PROJECTION, STORY_PAGE_PROJECTION, SIMILAR_STORY_PROJECTION
+from api import CHANGE_LOG_RETENTION, SUMMARY_PROJECTION
+
+# Indexes the app and the ingest rely on, per collection. The Atlas vector
+# search indexes (story_embed, embed_search) are managed in Atlas.
+INDEXES = {
+    'stories': [
+        IndexModel([('updated', DESCENDING), ('_id', DESCENDING)], name='updated'),
+        IndexModel([('summary.importance', DESCENDING), ('updated', DESCENDING), ('_id', DESCENDING)],
+                   name='importance_updated'),
+        IndexModel([('summary.categories', ASCENDING), ('updated', DESCENDING), ('_id', DESCENDING)],
+                   name='categories_updated'),
+        IndexModel([('summary.categories', ASCENDING), ('summary.importance', DESCENDING), ('updated', DESCENDING),
+                    ('_id', DESCENDING)], name='categories_importance_updated'),
+        IndexModel([('summary.keywords', ASCENDING), ('updated', DESCENDING), ('_id', DESCENDING)],
+                   name='keywords_updated'),
+        IndexModel([('summary.keywords', ASCENDING), ('summary.importance', DESCENDING), ('updated', DESCENDING),
+                    ('_id', DESCENDING)], name='keywords_importance_updated'),
+        IndexModel([('headline', ASCENDING)], name='headline'),
+        IndexModel([('link', ASCENDING)], name='link', unique=True),
+        IndexModel([('topic', ASCENDING)], name='topic'),
+    ],
+    'topics': [
+        IndexModel([('updated', DESCENDING), ('_id', DESCENDING)], name='updated'),
+    ],
+    'keywords': [
+        IndexModel([('keyword', ASCENDING)], name='keyword', unique=True),
+    ],
+    'news_summaries': [
+        IndexModel([('date', DESCENDING)], name='date'),
+    ],
+    'changes': [
+        IndexModel([('time', ASCENDING)], name='time_ttl',
+                   expireAfterSeconds=int(CHANGE_LOG_RETENTION.total_seconds())),
+    ],
+}
+
+def apply_indexes(db) -> bool:
+    """
+    Creates any missing indexes. Existing indexes with the same definition
+    are left alone, so this is safe to run on every deploy.
+
+    Returns:
+        bool: True if every index exists afterwards
+    """
+    ok = True
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                name = db[collection].create_indexes([index])[0]
+                print(f"{collection}: {name} ok")
+            except OperationFailure as e:
+                print(f"{collection}: {index.document['name']} failed: {e}")
+                ok = False
+    return ok
+
+def route_queries():
+    """
+    The query shapes the web routes issue, as (name, collection, filter,
+    projection, sort, bounded). Paginated routes are listed for both the
+    first page and a continuation page. bounded marks queries allowed to
+    sort in memory because their input is capped, for the reason given.
+    """
+    now = datetime.now()
+    sample_position = {
+        'time': [now - timedelta(hours=1), ObjectId()],
+        'importance': [5, now - timedelta(hours=1), ObjectId()],
+    }
+    story_lists = [
+        ('stories', {'updated': {'$gt': now - timedelta(days=1)}}),
+        ('category', {'updated': {'$gt': now - timedelta(days=14)}, 'summary.categories': 'World'}),
+        ('keyword', {'summary.keywords': {'$in': ['Ukraine', 'Kyiv']}}),
+    ]
+    queries = []
+    for name, query in story_lists:
+        for sort, keys in SORT_KEYS.items():
+            queries.append((f'{name} sort={sort}', 'stories', query, STORY_CARD_PROJECTION, keys, False))
+            queries.append((f'{name} sort={sort} after', 'stories',
+                            {'$and': [query, keyset_filter(keys, sample_position[sort])]}, STORY_CARD_PROJECTION, keys,
+                            False))
+    topics_query = {'updated': {'$gte': now - timedelta(hours=48)}, 'merged_into': {'$exists': False}}
+    ids = {'$in': [ObjectId() for _ in range(10)]}
+    queries += [
+        ('topics', 'topics', topics_query, TOPIC_CARD_PROJECTION, SORT_KEYS['time'], False),
+        ('topics after', 'topics', {'$and': [topics_query, keyset_filter(SORT_KEYS['time'], sample_position['time'])]},
+         TOPIC_CARD_PROJECTION, SORT_KEYS['time'], False),
+        ('story', 'stories', {'_id': ObjectId()}, STORY_PAGE_PROJECTION, None, False),
+        ('topic', 'topics', {'_id': ObjectId()}, TOPIC_CARD_PROJECTION, None, False),
+        # At most one page of ids from the search index
+        ('search results', 'stories', {'_id': ids}, STORY_CARD_PROJECTION, None, False),
+        ('keyword lookup', 'keywords', {'keyword': 'Ukraine'}, {'similar_keywords': 1}, None, False),
+        ('daily summary', 'news_summaries', {}, SUMMARY_PROJECTION, [('date', -1)], False),
+        ('feed snapshot', 'feeds', {'_id': 'stories'}, None, None, False),
+        ('data version', 'meta', {'_id': 'data_version'}, None, None, False),
+        ('changes', 'changes', {'_id': {'$gt': 1, '$lte': 2}}, None, [('_id', 1)], False),
+        ('changes oldest', 'changes', {}, {'time': 1}, [('_id', 1)], False),
+        # The change log only holds CHANGE_LOG_RETENTION of entries (TTL index)
+        ('changes since time', 'changes', {'_id': {'$lte': 2}, 'time': {'$gt': now - timedelta(hours=1)}}, None,
+         [('_id', 1)], True),
+        ('changed stories', 'stories', {'_id': ids}, STORY_CARD_PROJECTION, None, False),
+        ('changed topics', 'topics', {'_id': ids, 'merged_into': {'$exists': False}}, TOPIC_CARD_PROJECTION, None,
+         False),
+        # Sorted by updated among the ids of one page of topics' member lists
+        ('topic articles', 'stories', {'_id': ids}, STORY_CARD_PROJECTION, [('updated', -1)], True),
+        # Sorted among the links the ingest stored on the story, a vector
+        # search's worth plus later neighbors
+        ('similar stories', 'stories', {'_id': ids}, SIMILAR_STORY_PROJECTION, [('updated', -1)], True),
+        ('ingest headline check', 'stories', {'headline': 'x'}, None, None, False),
+        ('ingest link check', 'stories', {'link': 'x'}, None, None, False),
+    ]
+    return queries
+
+def plan_stages(plan) -> list:
+    """
+    Returns every stage name in an explain() plan tree.
+    """
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+def check_query_plans(db) -> bool:
+    """
+    Explains each route query and reports any that scan the whole collection
+    or sort in memory, unless route_queries marks the sort as bounded.
+
+    Returns:
+        bool: True if every query is served from an index
+    """
+    ok = True
+    for name, collection, query, projection, sort, bounded in route_queries():
+        cursor = db[collection].find(query, projection).limit(PAGE_SIZE + 1)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = plan_stages(cursor.explain()['queryPlanner']['winningPlan'])
+        bad = [s for s in stages if s == 'COLLSCAN' or (s == 'SORT' and not bounded)]
+        if bad:
+            ok = False
+            print(f"FAIL {name}: {', '.join(bad)} in {' <- '.join(stages)}")
+        else:
+            print(f"ok   {name}: {' <- '.join(stages)}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage and verify the MongoDB indexes the app relies on.")
+    parser.add_argument('command', choices=['apply', 'check'],
+                        help="apply: create missing indexes; check: explain the route queries")
+    args = parser.parse_args()
+
+    db = get_mongo_client()["nb3000"]
+    if args.command == 'apply':
+        ok = apply_indexes(db)
+    else:
+        ok = check_query_plans(db)
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import List, NamedTuple, Optional
+from bson import ObjectId
+
+# Written by the ingest (cron/search_index.py). SEARCH_DB overrides the location.
+DEFAULT_SEARCH_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'search.db')
+
+MAX_QUERY_TERMS = 16
+
+# bm25() weights for headline, title, summary and keywords
+COLUMN_WEIGHTS = (4.0, 4.0, 1.0, 2.0)
+
+ORDER_BY = {
+    'relevance': 'terms.rank',
+    'time': 'docs.updated DESC',
+    'importance': 'docs.importance DESC, terms.rank',
+}
+
+class SearchResults(NamedTuple):
+    ids: List[ObjectId]
+    has_more: bool
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    Turns free text into an FTS5 query that matches stories containing every
+    word. Each word is quoted, so user input can't use FTS5 syntax.
+
+    Returns:
+        str: The MATCH expression, or None if the query has no words
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms)
+
+def search_offset(after: Optional[str], before: Optional[str], limit: int) -> int:
+    """
+    Search results are ranked rather than keyed, so their page cursors are
+    plain offsets: after=n starts at result n and before=n ends just before it.
+    """
+    try:
+        if after:
+            return max(int(after), 0)
+        if before:
+            return max(int(before) - limit, 0)
+    except ValueError:
+        pass
+    return 0
+
+class StorySearch:
+    """
+    Full-text search over stories, ranked with BM25 by SQLite FTS5.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('SEARCH_DB') or DEFAULT_SEARCH_DB
+        self.local = threading.local()
+        self.sql = {
+            sort: 'SELECT docs.story_id FROM terms JOIN docs ON docs.id = terms.rowid '
+                  f'WHERE terms MATCH ? AND terms.rank MATCH ? ORDER BY {order} LIMIT ? OFFSET ?'
+            for sort, order in ORDER_BY.items()
+        }
+        self.rank_function = 'bm25(' + ', '.join(str(w) for w in COLUMN_WEIGHTS) + ')'
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        # Connections can't be shared across threads or forks
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            if not os.path.exists(self.path):
+                return None
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, timeout=5)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def search(self, query: str, sort: str = 'relevance', offset: int = 0, limit: int = 30) -> SearchResults:
+        """
+        Args:
+            query: Free text
+            sort: 'relevance', 'time' or 'importance'
+            offset: Number of results to skip
+            limit: Maximum number of results
+
+        Returns:
+            SearchResults: The ids of matching stories in order, and whether
+            there are more after them
+        """
+        expression = match_expression(query)
+        conn = self._conn()
+        if expression is None or conn is None:
+            return SearchResults([], False)
+        rows = conn.execute(self.sql.get(sort, self.sql['relevance']),
+                            (expression, self.rank_function, limit + 1, offset)).fetchall()
+        ids = [ObjectId(row[0]) for row in rows[:limit]]
+        return SearchResults(ids, len(rows) > limit)
@@ -0,0 +1,95 @@
+import os
+import inspect
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+from jinja2 import Environment, FileSystemBytecodeCache
+from markupsafe import Markup
+
+class FragmentCache:
+    """
+    In-process LRU of rendered template fragments. Templates wrap a card in
+
+        {% call cached_fragment('topic-card', topic._id, topic.content_key) %}
+            ...
+        {% endcall %}
+
+    and the body is only rendered when that key hasn't been seen. The key
+    must capture everything the body depends on. For cards that is the
+    content_key view_models computes from the document's raw `updated` time
+    and every field the card renders. The formatted `updated` alone only
+    has minute resolution, and compaction rewrites topics without touching
+    it.
+    """
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple, Markup] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Markup]:
+        with self.lock:
+            markup = self.entries.get(key)
+            if markup is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return markup
+
+    def set(self, key: tuple, markup: Markup) -> Markup:
+        with self.lock:
+            self.entries[key] = markup
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return markup
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def cached_fragment(self, *key: Hashable, caller):
+        """
+        The Jinja global behind {% call cached_fragment(...) %}.
+
+        Args:
+            *key: Fragment name followed by the values the fragment depends on
+            caller: The call block's body, supplied by Jinja
+
+        Returns:
+            Markup: The rendered body. In an async environment (Quart) the
+            body renders to a coroutine, so a coroutine is returned and Jinja
+            awaits it.
+        """
+        markup = self.get(key)
+        if markup is not None:
+            return markup
+        body = caller()
+        if inspect.isawaitable(body):
+            return self._set_async(key, body)
+        return self.set(key, Markup(body))
+
+    async def _set_async(self, key: tuple, body) -> Markup:
+        return self.set(key, Markup(await body))
+
+    def install(self, env: Environment):
+        env.globals['cached_fragment'] = self.cached_fragment
+
+def bytecode_cache_from_env(app_name: str) -> FileSystemBytecodeCache:
+    """
+    Compiled templates are kept on disk so a new worker loads them instead of
+    compiling every template again. TEMPLATE_CACHE_DIR picks the directory;
+    by default Jinja uses a private directory under the system temp dir.
+    Entries are checked against the template source, so edits are picked up.
+
+    Args:
+        app_name: Goes in the file names. Jinja compiles the same template
+            differently for an async environment, so flask_app and async_app
+            must not share entries.
+    """
+    directory = os.getenv('TEMPLATE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory, pattern=f'__jinja2_{app_name}_%s.cache')
@@ -0,0 +1,96 @@
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+from bson import ObjectId
+from nb3000.listing import STORY_CARD_PROJECTION, TOPIC_CARD_PROJECTION
+
+# The story page renders the full story document, except for the vector
+STORY_PAGE_PROJECTION = {'embedding': 0}
+
+SIMILAR_STORY_PROJECTION = {'summary.title': 1, 'source': 1, 'updated': 1}
+
+def format_time(dt: Optional[datetime]) -> str:
+    return dt.strftime("%Y-%m-%d %H:%M UTC") if dt else "N/A"
+
+def importance_icons(importance: int) -> str:
+    return "\U0001F525" * importance
+
+def content_key(*values) -> str:
+    """
+    A short hash of everything a card renders, for its fragment cache key
+    (see template_cache.py). Edits that keep a document's `updated` time,
+    such as compaction rewriting a topic's summary, still change the key.
+    """
+    return hashlib.blake2b(repr(values).encode(), digest_size=12).hexdigest()
+
+@dataclass(slots=True)
+class StoryCard:
+    _id: ObjectId
+    headline: str
+    alt_headline: Optional[str]
+    updated: str
+    link: str
+    summary: Optional[str]
+    importance_score: int
+    importance: str
+    keywords: List[str]
+    category: Optional[str]
+    source: Optional[str]
+    content_key: str = ''
+
+    @classmethod
+    def from_doc(cls, story: dict) -> 'StoryCard':
+        summary = story.get("summary", {})
+        card = cls(
+            _id=story.get("_id"),
+            headline=story.get("headline"),
+            alt_headline=summary.get("title"),
+            updated=format_time(story.get("updated")),
+            link=story.get("link"),
+            summary=summary.get("summary"),
+            importance_score=summary.get("importance", 0),
+            importance=importance_icons(summary.get("importance", 0)),
+            keywords=summary.get("keywords") or [],
+            category=summary.get("category"),
+            source=story.get("source"),
+        )
+        card.content_key = content_key(card._id, story.get("updated"), card.headline, card.alt_headline, card.link,
+                                       card.summary, card.importance_score, card.keywords, card.category, card.source)
+        return card
+
+@dataclass(slots=True)
+class TopicCard:
+    _id: ObjectId
+    title: str
+    summary_text: str
+    updated: str
+    source: Optional[str]
+    keywords: List[str]
+    category: str
+    importance_score: int
+    importance: str
+    articles: List[StoryCard] = field(default_factory=list)
+    article_count: int = 0
+    content_key: str = ''
+
+    @classmethod
+    def from_doc(cls, topic: dict, articles: List[dict]) -> 'TopicCard':
+        summary = topic.get('summary', {})
+        cards = [StoryCard.from_doc(a) for a in articles]
+        card = cls(
+            _id=topic.get('_id'),
+            title=summary.get('title', 'Topic Title Missing'),
+            summary_text=summary.get('summary', 'Topic summary missing.'),
+            updated=format_time(topic.get('updated')),
+            source=topic.get('source'),
+            keywords=summary.get('keywords', []),
+            category=summary.get('category', 'N/A'),
+            importance_score=summary.get('importance', 0),
+            importance=importance_icons(summary.get('importance', 0)),
+            articles=cards,
+            article_count=len(cards),
+        )
+        card.content_key = content_key(topic.get('updated'), card.title, card.summary_text, card.source, card.keywords,
+                                       card.category, card.importance_score, [a.content_key for a in cards])
+        return card